@@ -0,0 +1,65 @@
+import time
+
+import numpy as np
+import torch
+
+from agent0.deepq.config import AlgoEnum, DeviceEnum, ExpConfig
+
+
+def make_cfg(algo=AlgoEnum.dqn, device=None, batch_size=32, action_dim=6):
+    if device is None:
+        device = DeviceEnum.cuda if torch.cuda.is_available() else DeviceEnum.cpu
+    cfg = ExpConfig(
+        obs_shape=(4, 84, 84),
+        action_dim=action_dim,
+        device=device,
+        wandb=False,
+        tb=False,
+    )
+    cfg.learner.algo = algo
+    cfg.learner.batch_size = batch_size
+    return cfg
+
+
+def random_batch(cfg: ExpConfig):
+    batch_size = cfg.learner.batch_size
+    frames = torch.randint(
+        0, 256, (batch_size, 2 * int(np.prod(cfg.obs_shape))), dtype=torch.uint8
+    )
+    actions = torch.randint(0, cfg.action_dim, (batch_size,))
+    rewards = torch.randn(batch_size)
+    terminals = torch.rand(batch_size).lt(0.01).float()
+    weights = torch.ones(batch_size)
+    indices = torch.arange(batch_size)
+    masks = torch.rand(batch_size, cfg.learner.num_heads)
+    masks = masks.lt(cfg.learner.head_mask_prob)
+    return tuple(
+        x.to(cfg.device.value)
+        for x in (frames, actions, rewards, terminals, weights, indices, masks)
+    )
+
+
+def synchronize(device):
+    if device == DeviceEnum.cuda.value:
+        torch.cuda.synchronize()
+
+
+def timeit(fn, iters=50, warmup=5, device="cpu"):
+    for _ in range(warmup):
+        fn()
+    synchronize(device)
+    tic = time.perf_counter()
+    for _ in range(iters):
+        fn()
+    synchronize(device)
+    return (time.perf_counter() - tic) / iters
+
+
+def peak_memory(fn, device="cpu"):
+    if device != DeviceEnum.cuda.value:
+        return None
+    torch.cuda.synchronize()
+    torch.cuda.reset_peak_memory_stats()
+    fn()
+    torch.cuda.synchronize()
+    return torch.cuda.max_memory_allocated() / 2**20
@@ -0,0 +1,78 @@
+import argparse
+
+import torch
+import torch.nn as nn
+
+from agent0.benchmarks.common import timeit
+from agent0.ddpg.model import EnsembleCritic
+
+
+def sequential_critic(num_inputs, hidden_size):
+    # One critic as SACMLP and TD3MLP built them before EnsembleCritic.
+    return nn.Sequential(
+        nn.Linear(num_inputs, hidden_size),
+        nn.Tanh(),
+        nn.Linear(hidden_size, hidden_size),
+        nn.Tanh(),
+        nn.Linear(hidden_size, 1),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="ddpg critics: separate Sequentials vs one EnsembleCritic"
+    )
+    parser.add_argument("--num_critics", type=int, nargs="+", default=[2, 5, 10])
+    parser.add_argument("--num_target_critics", type=int, default=2)
+    parser.add_argument("--obs_dim", type=int, default=17)
+    parser.add_argument("--action_dim", type=int, default=6)
+    parser.add_argument("--hidden_size", type=int, default=256)
+    parser.add_argument("--batch_size", type=int, default=256)
+    parser.add_argument("--iters", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    num_inputs = args.obs_dim + args.action_dim
+    x = torch.randn(args.batch_size, num_inputs, device=device)
+    target = torch.randn(args.batch_size, 1, device=device)
+    m = args.num_target_critics
+
+    for n in args.num_critics:
+        critics = [
+            sequential_critic(num_inputs, args.hidden_size).to(device)
+            for _ in range(n)
+        ]
+        ensemble = EnsembleCritic(num_inputs, args.hidden_size, n).to(device)
+
+        def separate_update():
+            loss = sum((c(x) - target).pow(2).mean() for c in critics)
+            loss.backward()
+
+        def ensemble_update():
+            loss = (ensemble(x) - target).pow(2).mean(dim=(1, 2)).sum()
+            loss.backward()
+
+        def separate_target():
+            heads = torch.randperm(n)[:m].tolist()
+            return torch.stack([critics[i](x) for i in heads]).min(dim=0).values
+
+        with torch.no_grad():
+            target_separate = timeit(separate_target, args.iters, device=device)
+            target_ensemble = timeit(
+                lambda: ensemble.min_value(x, m), args.iters, device=device
+            )
+        update_separate = timeit(separate_update, args.iters, device=device)
+        update_ensemble = timeit(ensemble_update, args.iters, device=device)
+        print(
+            f"{n:2d} critics: forward+backward {update_separate * 1e3:7.2f} -> "
+            f"{update_ensemble * 1e3:7.2f} ms "
+            f"({update_separate / update_ensemble:.2f}x) | min-of-{m} target "
+            f"{target_separate * 1e3:6.2f} -> {target_ensemble * 1e3:6.2f} ms "
+            f"({target_separate / target_ensemble:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
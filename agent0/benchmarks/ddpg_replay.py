@@ -0,0 +1,100 @@
+import argparse
+import random
+
+import numpy as np
+import torch
+
+from agent0.benchmarks.common import timeit
+from agent0.ddpg.replay_buffer import ReplayBuffer
+
+
+class ListReplayBuffer:
+    # The list-of-tuples buffer ReplayBuffer replaced, kept as the baseline.
+    def __init__(self, size):
+        self._storage = []
+        self._maxsize = size
+        self._next_idx = 0
+
+    def __len__(self):
+        return len(self._storage)
+
+    def add(self, obs_t, action, reward, obs_tp1, done):
+        data = (obs_t, action, reward, obs_tp1, done)
+        if self._next_idx >= len(self._storage):
+            self._storage.append(data)
+        else:
+            self._storage[self._next_idx] = data
+        self._next_idx = (self._next_idx + 1) % self._maxsize
+
+    def sample(self, batch_size):
+        idxes = [random.randint(0, len(self._storage) - 1) for _ in range(batch_size)]
+        obses_t, actions, rewards, obses_tp1, dones = [], [], [], [], []
+        for i in idxes:
+            obs_t, action, reward, obs_tp1, done = self._storage[i]
+            obses_t.append(np.asarray(obs_t))
+            actions.append(np.asarray(action))
+            rewards.append(reward)
+            obses_tp1.append(np.asarray(obs_tp1))
+            dones.append(done)
+        return (
+            np.array(obses_t),
+            np.array(actions),
+            np.array(rewards),
+            np.array(obses_tp1),
+            np.array(dones),
+        )
+
+    def sample_tensors(self, batch_size):
+        # What Agent.train_step did with the sampled arrays.
+        return tuple(torch.tensor(x).float() for x in self.sample(batch_size))
+
+
+def fill(replay, size, obs_dim, action_dim):
+    obs = np.random.randn(obs_dim)
+    for _ in range(size):
+        next_obs = np.random.randn(obs_dim)
+        action = np.random.uniform(-1, 1, action_dim).astype(np.float32)
+        replay.add(obs, action, random.random(), next_obs, 0)
+        obs = next_obs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ddpg replay: list vs ring buffer")
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--obs_dim", type=int, default=17)
+    parser.add_argument("--action_dim", type=int, default=6)
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[256, 1024])
+    parser.add_argument("--iters", type=int, default=200)
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    dims = args.size, args.obs_dim, args.action_dim
+    replays = dict(list=ListReplayBuffer(args.size), ring=ReplayBuffer(args.size))
+    results = {}
+    for name, replay in replays.items():
+        fill(replay, *dims)
+        results[f"add/{name}"] = timeit(
+            lambda: fill(replay, 1000, *dims[1:]), args.iters // 10
+        )
+        for batch_size in args.batch_sizes:
+            results[f"sample/bs{batch_size}/{name}"] = timeit(
+                lambda: replay.sample(batch_size), args.iters
+            )
+            results[f"sample_tensors/bs{batch_size}/{name}"] = timeit(
+                lambda: replay.sample_tensors(batch_size), args.iters
+            )
+
+    # add is timed over 1000 transitions; the rest are per call.
+    for key in results:
+        if not key.endswith("/list"):
+            continue
+        key = key[: -len("/list")]
+        old, new = results[f"{key}/list"], results[f"{key}/ring"]
+        print(
+            f"{key:<24} list {old * 1e3:8.3f} ms | ring {new * 1e3:8.3f} ms"
+            f" ({old / new:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
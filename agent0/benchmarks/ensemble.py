@@ -0,0 +1,49 @@
+import argparse
+
+import torch
+
+import agent0.deepq.agent as agents
+from agent0.benchmarks.common import make_cfg, random_batch, timeit
+from agent0.deepq.config import AlgoEnum
+from agent0.deepq.model import DeepQNet
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--algo", default="dqn", choices=[a.name for a in AlgoEnum])
+    parser.add_argument("--num_heads", type=int, nargs="+", default=[2, 5, 10])
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--iters", type=int, default=20)
+    args = parser.parse_args()
+
+    cfg = make_cfg(AlgoEnum[args.algo], batch_size=args.batch_size)
+    device = cfg.device.value
+    learner_cls = getattr(agents, f"{args.algo.upper()}Learner")
+    obs = torch.rand(cfg.actor.num_envs, *cfg.obs_shape).to(device)
+    for k in args.num_heads:
+        # K separate networks, each with its own encoder, against one K-head net.
+        nets = [DeepQNet(cfg).to(device) for _ in range(k)]
+        learners = [learner_cls(cfg) for _ in range(k)]
+        batch = random_batch(cfg)
+        cfg.learner.num_heads = k
+        ensemble = DeepQNet(cfg).to(device)
+        learner = learner_cls(cfg)
+        cfg.learner.num_heads = 1
+
+        with torch.no_grad():
+            act_separate = timeit(lambda: [n.qval(obs) for n in nets], args.iters)
+            act_shared = timeit(lambda: ensemble.head_qvals(obs), args.iters)
+        train_separate = timeit(
+            lambda: [x.train(batch) for x in learners], args.iters, device=device
+        )
+        train_shared = timeit(lambda: learner.train(batch), args.iters, device=device)
+        print(
+            f"{k:2d} heads: act {act_separate * 1e3:7.2f} -> {act_shared * 1e3:7.2f} ms"
+            f" ({act_separate / act_shared:.2f}x) | train "
+            f"{train_separate * 1e3:7.2f} -> {train_shared * 1e3:7.2f} ms"
+            f" ({train_separate / train_shared:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import argparse
+
+import torch
+import torch.nn as nn
+
+from agent0.benchmarks.common import make_cfg, peak_memory, random_batch, timeit
+from agent0.deepq.agent import FQFLearner
+from agent0.deepq.config import AlgoEnum
+
+
+def legacy_update(learner, q_loss, fraction_loss, weights):
+    # Former FQF update: two backward passes through a retained graph.
+    learner.fqf_optimizer.zero_grad()
+    fraction_loss.mul(weights).sum().backward(retain_graph=True)
+    if learner.cfg.learner.max_grad_norm > 0:
+        nn.utils.clip_grad_norm_(
+            learner.model.head.fraction_net.parameters(),
+            learner.cfg.learner.max_grad_norm,
+        )
+    learner.fqf_optimizer.step()
+    learner.optimizer.zero_grad()
+    q_loss.mul(weights).sum().backward()
+    learner.optimizer.step()
+
+
+def run_update(learner, data, legacy):
+    frames, actions, rewards, terminals, weights = map(lambda x: x.float(), data[:5])
+    cfg = learner.cfg
+    frames = frames.reshape(-1, cfg.obs_shape[0] * 2, *cfg.obs_shape[1:]).div(255.0)
+    obs, next_obs = torch.split(frames, cfg.obs_shape[0], 1)
+    q_loss, fraction_loss = learner.train_step(
+        obs, actions.long(), rewards, terminals, next_obs
+    )
+    if legacy:
+        legacy_update(learner, q_loss, fraction_loss, weights)
+    else:
+        learner.update(q_loss, fraction_loss, weights)
+
+
+def check_equivalence(cfg, data):
+    torch.manual_seed(0)
+    learner = FQFLearner(cfg)
+    reference = FQFLearner(cfg)
+    reference.model.load_state_dict(learner.model.state_dict())
+    reference.model_target.load_state_dict(learner.model_target.state_dict())
+
+    torch.manual_seed(1)
+    run_update(learner, data, legacy=False)
+    torch.manual_seed(1)
+    run_update(reference, data, legacy=True)
+
+    return max(
+        (p - q).abs().max().item()
+        for p, q in zip(learner.model.parameters(), reference.model.parameters())
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--iters", type=int, default=50)
+    args = parser.parse_args()
+
+    cfg = make_cfg(AlgoEnum.fqf, batch_size=args.batch_size)
+    device = cfg.device.value
+    data = random_batch(cfg)
+    print(f"max param diff (fused vs legacy): {check_equivalence(cfg, data):.3e}")
+
+    learner = FQFLearner(cfg)
+    for legacy in (True, False):
+        name = "legacy" if legacy else "fused"
+        step_time = timeit(
+            lambda: run_update(learner, data, legacy), args.iters, device=device
+        )
+        memory = peak_memory(lambda: run_update(learner, data, legacy), device)
+        memory = "n/a" if memory is None else f"{memory:.1f} MiB"
+        print(f"{name:>6}: {step_time * 1e3:.2f} ms/step | peak memory {memory}")
+
+
+if __name__ == "__main__":
+    main()
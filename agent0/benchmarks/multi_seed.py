@@ -0,0 +1,42 @@
+import argparse
+
+import torch
+
+import agent0.deepq.agent as agents
+from agent0.benchmarks.common import make_cfg, random_batch, timeit
+from agent0.deepq.config import AlgoEnum
+from agent0.deepq.multi_seed import StackedLearner
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--algo", default="dqn", choices=[a.name for a in AlgoEnum])
+    parser.add_argument("--num_seeds", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--iters", type=int, default=20)
+    args = parser.parse_args()
+
+    cfg = make_cfg(AlgoEnum[args.algo], batch_size=args.batch_size)
+    device = cfg.device.value
+    learner_cls = getattr(agents, f"{args.algo.upper()}Learner")
+    for k in args.num_seeds:
+        learners = [learner_cls(cfg) for _ in range(k)]
+        batches = [random_batch(cfg) for _ in range(k)]
+
+        def separate():
+            for learner, batch in zip(learners, batches):
+                learner.train(batch)
+
+        stacked = StackedLearner([learner_cls(cfg) for _ in range(k)])
+        data = tuple(torch.stack(x) for x in zip(*batches))
+        t_separate = timeit(separate, args.iters, device=device)
+        t_stacked = timeit(lambda: stacked.train(data), args.iters, device=device)
+        print(
+            f"{k:2d} seeds: separate {k / t_separate:7.1f} | "
+            f"stacked {k / t_stacked:7.1f} replica updates/s "
+            f"({t_separate / t_stacked:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
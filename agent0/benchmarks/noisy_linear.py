@@ -0,0 +1,93 @@
+import argparse
+
+import torch
+
+from agent0.benchmarks.common import timeit
+from agent0.deepq.model import NoisyLinear
+
+
+def buffer_bytes(module):
+    return sum(b.numel() * b.element_size() for b in module.buffers())
+
+
+def make_pair(in_features, out_features, device):
+    dense = NoisyLinear(in_features, out_features).to(device)
+    factorized = NoisyLinear(in_features, out_features, factorized=True).to(device)
+    factorized.load_state_dict(
+        {k: v for k, v in dense.state_dict().items() if k != "weight_epsilon"}
+    )
+    # Share one noise draw so both layers must agree exactly.
+    factorized.noise_in.copy_(NoisyLinear.transform_noise(dense.noise_in))
+    factorized.noise_out_weight.copy_(
+        NoisyLinear.transform_noise(dense.noise_out_weight)
+    )
+    return dense, factorized
+
+
+def check_distribution(layer, x, draws):
+    outs = []
+    for _ in range(draws):
+        layer.reset_noise()
+        outs.append(layer(x))
+    outs = torch.stack(outs)
+    return outs.mean().item(), outs.std().item()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--in_features", type=int, default=3136)
+    parser.add_argument("--out_features", type=int, default=512)
+    parser.add_argument("--batch_size", type=int, default=512)
+    parser.add_argument("--iters", type=int, default=50)
+    parser.add_argument("--draws", type=int, default=200)
+    args = parser.parse_args()
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    dense, factorized = make_pair(args.in_features, args.out_features, device)
+    x = torch.randn(args.batch_size, args.in_features, device=device)
+
+    with torch.no_grad():
+        diff = (dense(x) - factorized(x)).abs().max().item()
+        print(f"max output diff with shared noise: {diff:.3e}")
+        for name, layer in (("dense", dense), ("factorized", factorized)):
+            mean, std = check_distribution(layer, x[:8], args.draws)
+            print(f"{name:>10}: output mean {mean:.4f} std {std:.4f}")
+
+    results = {}
+    for name, layer in (("dense", dense), ("factorized", factorized)):
+
+        def forward_backward():
+            layer.zero_grad()
+            layer(x).sum().backward()
+
+        results[name] = (
+            buffer_bytes(layer) / 2**20,
+            timeit(layer.reset_noise, args.iters, device=device) * 1e6,
+            timeit(forward_backward, args.iters, device=device) * 1e3,
+        )
+        buffers, reset_time, step_time = results[name]
+        print(
+            f"{name:>10}: buffers {buffers:.2f} MiB | "
+            f"reset_noise {reset_time:.1f} us | "
+            f"forward+backward {step_time:.2f} ms"
+        )
+
+    # Factorized mode runs a second matmul for the noise term on every forward
+    # and backward, so it only pays off when memory or reset_noise dominate.
+    metrics = (
+        ("buffers", "smaller", "LARGER"),
+        ("reset_noise", "faster", "SLOWER"),
+        ("forward+backward", "faster", "SLOWER"),
+    )
+    for (metric, better, worse), old, new in zip(
+        metrics, results["dense"], results["factorized"]
+    ):
+        ratio = max(old, new) / min(old, new)
+        print(
+            f"factorized {metric}: {ratio:.1f}x {better if new < old else worse}"
+            " than dense"
+        )
+
+
+if __name__ == "__main__":
+    main()
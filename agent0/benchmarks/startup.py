@@ -0,0 +1,116 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from agent0.deepq.config import ExpConfig, env_kwargs
+
+# Each case runs in a fresh interpreter, so module caches and warm imports from
+# earlier cases do not hide startup costs.
+TRAINER = """
+from agent0.common.env_spec import env_spec
+from agent0.deepq.config import DeviceEnum, ExpConfig, env_kwargs
+cfg = ExpConfig(env_id="{env_id}", device=DeviceEnum.cpu, wandb=False, tb=False,
+                logdir="{logdir}")
+cfg.obs_shape, cfg.action_dim = env_spec(cfg.env_id, **env_kwargs(cfg))
+from agent0.deepq.trainer import Trainer
+trainer = Trainer(cfg)
+{extra}
+for actor in trainer.actors:
+    actor.close()
+trainer.sink.close()
+"""
+
+CASES = {
+    "python": "pass",
+    "import_main": "import agent0.deepq.main",
+    "import_launch": "import agent0.deepq.launch",
+    # Spec lookup only: the kwargs come from the parent, as config imports torch.
+    "env_spec": (
+        "from agent0.common.env_spec import env_spec\n"
+        "env_spec('{env_id}', **{kwargs})"
+    ),
+    "trainer_ready": TRAINER.format(env_id="{env_id}", logdir="{logdir}", extra=""),
+    "first_sample": TRAINER.format(
+        env_id="{env_id}", logdir="{logdir}", extra="trainer.actors[1].sample(1.0)"
+    ),
+}
+
+
+def run_case(code, env, args=()):
+    tic = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, *args, "-c", code], env=env, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - tic
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if len(lines) > 0 else "failed")
+    return elapsed, proc.stderr
+
+
+def slowest_imports(module, env, top):
+    # -X importtime reports "self | cumulative | name" in microseconds.
+    _, stderr = run_case(f"import {module}", env, ("-X", "importtime"))
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time of deepq entry points")
+    parser.add_argument("--env_id", default="Synthetic")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--only", nargs="*", choices=list(CASES), default=None)
+    parser.add_argument("--importtime", type=int, default=0, help="top N imports")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, XDG_CACHE_HOME=os.path.join(tmp, "cache"))
+        logdir = os.path.join(tmp, "logs")
+        kwargs = env_kwargs(ExpConfig(env_id=args.env_id))
+        fill = dict(env_id=args.env_id, logdir=logdir, kwargs=repr(kwargs))
+
+        # The first env_spec call fills the cache every later case reads from.
+        try:
+            cold, _ = run_case(CASES["env_spec"].format(**fill), env)
+            print(f"{'env_spec_cold':<16} {cold:8.3f}s")
+        except RuntimeError as e:
+            print(f"{'env_spec_cold':<16} skipped: {e}")
+
+        for name, code in CASES.items():
+            if args.only and name not in args.only:
+                continue
+            try:
+                times = [
+                    run_case(code.format(**fill), env)[0] for _ in range(args.repeats)
+                ]
+            except RuntimeError as e:
+                print(f"{name:<16} skipped: {e}")
+                continue
+            print(
+                f"{name:<16} {statistics.median(times):8.3f}s "
+                f"(min {min(times):.3f}s over {len(times)})"
+            )
+
+        modules = ("agent0.deepq.main", "agent0.deepq.launch")
+        for module in modules if args.importtime > 0 else ():
+            try:
+                rows = slowest_imports(module, env, args.importtime)
+            except RuntimeError as e:
+                print(f"\n{module}: {e}")
+                continue
+            print(f"\nSlowest imports of {module} (cumulative):")
+            for seconds, name in rows:
+                print(f"  {seconds:8.3f}s {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+import torch
+from lz4.block import compress
+
+from agent0.benchmarks.common import make_cfg, random_batch, timeit
+from agent0.deepq.config import AlgoEnum, DeviceEnum, ReplayEnum
+
+# Every case reports seconds per operation, so lower is always better.
+CASES = {}
+
+
+def case(name):
+    def register(fn):
+        CASES[name] = fn
+        return fn
+
+    return register
+
+
+def make_transition(frame_shape=(8, 84, 84)):
+    # Low-entropy frames so the compression ratio resembles Atari screens.
+    frames = np.random.randint(0, 4, frame_shape, dtype=np.uint8)
+    return compress(frames.tobytes()), 0, 0.0, False
+
+
+def make_replay(size, policy):
+    from agent0.deepq.replay import ReplayDataset
+
+    cfg = make_cfg(device=DeviceEnum.cpu)
+    cfg.replay.size = size
+    cfg.replay.policy = policy
+    replay = ReplayDataset(cfg)
+    # Entries share one compressed frame; only the container cost matters here.
+    block = [make_transition()] * 10000
+    while len(replay) < size:
+        replay.extend(block[: size - len(replay)])
+    return cfg, replay
+
+
+@case("replay")
+def bench_replay(args):
+    results = {}
+    for size in args.replay_sizes:
+        for policy in ReplayEnum:
+            cfg, replay = make_replay(size, policy)
+            tag = f"{size:.0e}/{policy.name}"
+            num_items = cfg.actor.num_envs * cfg.actor.sample_steps
+            block = [make_transition()] * num_items
+            results[f"replay_extend/{tag}"] = timeit(
+                lambda: replay.extend(block), args.iters
+            )
+            results[f"replay_sample_indices/{tag}"] = timeit(
+                lambda: next(iter(replay)), args.iters
+            )
+            ids = next(iter(replay))
+            results[f"replay_getitem_batch/{tag}"] = timeit(
+                lambda: [replay[i] for i in ids], args.iters
+            )
+            if policy == ReplayEnum.prioritize:
+                priorities = torch.rand(len(ids))
+                results[f"replay_update_priority/{tag}"] = timeit(
+                    lambda: replay.update_priority(ids, priorities), args.iters
+                )
+    return results
+
+
+@case("actor")
+def bench_actor(args):
+    from agent0.deepq.agent import Actor
+
+    cfg = make_cfg(device=DeviceEnum.cpu)
+    cfg.env_id = args.env_id
+    actor = Actor(cfg)
+    try:
+        num_frames = cfg.actor.num_envs * cfg.actor.sample_steps
+        seconds = timeit(lambda: actor.sample(0.01), max(args.iters // 10, 1), 1)
+        return {"actor_sample_per_frame": seconds / num_frames}
+    finally:
+        actor.close()
+
+
+@case("learner")
+def bench_learner(args):
+    import agent0.deepq.agent as agents
+
+    results = {}
+    for algo in AlgoEnum:
+        for batch_size in args.batch_sizes:
+            cfg = make_cfg(algo, DeviceEnum.cpu, batch_size)
+            learner = getattr(agents, f"{algo.name.upper()}Learner")(cfg)
+            data = random_batch(cfg)
+            results[f"learner_train/{algo.name}/bs{batch_size}"] = timeit(
+                lambda: learner.train(data), args.iters
+            )
+    return results
+
+
+@case("model")
+def bench_model(args):
+    from agent0.deepq.model import DeepQNet
+
+    results = {}
+    for algo in AlgoEnum:
+        cfg = make_cfg(algo, DeviceEnum.cpu)
+        model = DeepQNet(cfg)
+        obs = torch.rand(cfg.learner.batch_size, *cfg.obs_shape)
+        # qval is the acting path; IQN/FQF heads need sampled taus in forward.
+        with torch.no_grad():
+            if algo == AlgoEnum.dqn:
+                results["model_encoder"] = timeit(
+                    lambda: model.encoder(obs), args.iters
+                )
+            results[f"model_qval/{algo.name}"] = timeit(
+                lambda: model.qval(obs), args.iters
+            )
+    return results
+
+
+@case("ddpg_replay")
+def bench_ddpg_replay(args):
+    from agent0.ddpg.replay_buffer import ReplayBuffer
+
+    obs_dim, action_dim, size = 17, 6, 100000
+    replay = ReplayBuffer(size)
+    for _ in range(size):
+        replay.add(
+            np.random.randn(obs_dim),
+            np.random.randn(action_dim),
+            random.random(),
+            np.random.randn(obs_dim),
+            0,
+        )
+    return {"ddpg_replay_sample/bs256": timeit(lambda: replay.sample(256), args.iters)}
+
+
+def make_ddpg_agent(algo, obs_dim=17, action_dim=6):
+    # Agent.__init__ needs a simulator; build the learner state it trains on.
+    import copy
+
+    from agent0.ddpg.agent import Agent
+    from agent0.ddpg.config import Config
+    from agent0.ddpg.model import DDPGMLP, SACMLP, TD3MLP
+    from agent0.ddpg.replay_buffer import ReplayBuffer
+
+    agent = Agent.__new__(Agent)
+    agent.cfg = cfg = Config(algo=algo)
+    agent.device = torch.device("cpu")
+    agent.action_high = 1.0
+    net = {"ddpg": DDPGMLP, "sac": SACMLP, "td3": TD3MLP}[algo]
+    agent.network = net(obs_dim, action_dim, 1.0, cfg.hidden_size)
+    agent.target_network = copy.deepcopy(agent.network)
+    agent.params = list(agent.network.parameters())
+    agent.target_params = list(agent.target_network.parameters())
+    agent.actor_optimizer = torch.optim.Adam(
+        agent.network.get_policy_params(), lr=cfg.p_lr
+    )
+    agent.critic_optimizer = torch.optim.Adam(
+        agent.network.get_value_params(), lr=cfg.v_lr
+    )
+    agent.step_fn = {
+        "ddpg": agent.train_step_ddpg,
+        "sac": agent.train_step_sac,
+        "td3": agent.train_step_td3,
+    }
+    agent.total_steps = 0
+    agent.update_steps = 0
+    agent.noise_std = torch.tensor(cfg.action_noise_level)
+    agent.target_entropy = torch.tensor(-float(action_dim))
+    agent.log_alpha = torch.zeros(1, requires_grad=True)
+    agent.alpha_optim = torch.optim.Adam([agent.log_alpha], lr=cfg.p_lr)
+
+    agent.replay = ReplayBuffer(cfg.batch_size * 40)
+    for _ in range(cfg.batch_size * 40):
+        agent.replay.add(
+            np.random.randn(obs_dim),
+            np.random.uniform(-1, 1, action_dim),
+            random.random(),
+            np.random.randn(obs_dim),
+            0,
+        )
+    return agent
+
+
+@case("ddpg_train")
+def bench_ddpg_train(args):
+    results = {}
+    for algo in ("ddpg", "sac", "td3"):
+        agent = make_ddpg_agent(algo)
+        results[f"ddpg_train_step/{algo}"] = timeit(agent.train_step, args.iters)
+        # Seconds per update when 20 updates share one sampled block.
+        results[f"ddpg_train_utd20/{algo}"] = (
+            timeit(lambda: agent.train_step(20), max(args.iters // 10, 1), 1) / 20
+        )
+    return results
+
+
+@case("nips_encoder")
+def bench_nips_encoder(args):
+    from agent0.nips_encoder.trainer import EncoderDataset
+
+    state_shape = (4, 84, 84)
+    data = [make_transition(state_shape) for _ in range(1000)]
+    dataset = EncoderDataset(data, state_shape)
+    ids = np.random.randint(0, len(dataset), 64)
+    return {
+        "nips_encoder_decode/bs64": timeit(
+            lambda: [dataset[i] for i in ids], args.iters
+        )
+    }
+
+
+def metadata():
+    return dict(
+        timestamp=time.strftime("%Y-%m-%d %H:%M:%S"),
+        python=platform.python_version(),
+        torch=torch.__version__,
+        numpy=np.__version__,
+        platform=platform.platform(),
+        processor=platform.processor(),
+        cpu_count=os.cpu_count(),
+        torch_threads=torch.get_num_threads(),
+    )
+
+
+def run(args):
+    results, skipped = {}, {}
+    for name, fn in CASES.items():
+        if args.only and name not in args.only:
+            continue
+        print(f"[{name}]", flush=True)
+        try:
+            cases = fn(args)
+        except Exception as e:
+            # Optional simulators and modules are missing on some machines.
+            skipped[name] = f"{type(e).__name__}: {e}"
+            print(f"  skipped: {skipped[name]}")
+            continue
+        for key, seconds in cases.items():
+            print(f"  {key:<45} {seconds * 1e3:10.3f} ms")
+        results.update(cases)
+    return dict(meta=metadata(), results=results, skipped=skipped)
+
+
+def threshold_for(key, default, overrides):
+    # The longest matching prefix wins, e.g. learner_train/fqf=0.3.
+    best = None
+    for prefix in overrides:
+        if key.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return default if best is None else overrides[best]
+
+
+def compare(current, baseline, threshold, overrides):
+    regressions = []
+    print(f"\n{'case':<45} {'baseline':>10} {'current':>10} {'change':>8}")
+    for key, seconds in current["results"].items():
+        if key not in baseline["results"]:
+            continue
+        base = baseline["results"][key]
+        change = seconds / base - 1.0
+        limit = threshold_for(key, threshold, overrides)
+        flag = ""
+        if change > limit:
+            regressions.append(key)
+            flag = f"  REGRESSION (> {limit:+.0%})"
+        print(
+            f"{key:<45} {base * 1e3:10.3f} {seconds * 1e3:10.3f} {change:+8.1%}{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU benchmarks for agent0 hot paths")
+    parser.add_argument("--only", nargs="*", choices=list(CASES), default=None)
+    parser.add_argument("--iters", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument(
+        "--replay_sizes", type=int, nargs="+", default=[100000, 1000000]
+    )
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[32, 128])
+    parser.add_argument("--env_id", default="Synthetic", help="env for the actor case")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument(
+        "--case_threshold",
+        nargs="*",
+        default=[],
+        metavar="PREFIX=FRACTION",
+        help="per-case overrides, e.g. learner_train/fqf=0.3",
+    )
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    np.random.seed(0)
+    random.seed(0)
+
+    current = run(args)
+    with open(args.output, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"\nWrote {len(current['results'])} results to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        overrides = dict(item.split("=") for item in args.case_threshold)
+        overrides = {k: float(v) for k, v in overrides.items()}
+        regressions = compare(current, baseline, args.threshold, overrides)
+        if len(regressions) > 0:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import pickle
+import time
+from collections import deque
+
+import numpy as np
+from lz4.block import compress
+
+from agent0.common.transport import TransitionRing, lz4_bound
+
+
+def make_block(num_items, frame_shape=(8, 84, 84)):
+    # Low-entropy frames so the compression ratio resembles Atari screens.
+    frames = np.random.randint(0, 4, (num_items, *frame_shape), dtype=np.uint8)
+    return [
+        (compress(f.tobytes()), np.int64(i % 6), np.float64(0.0), np.bool_(False))
+        for i, f in enumerate(frames)
+    ]
+
+
+# Both paths end in a replay-like deque, as TrainerNode's ingest does.
+def bench_pickle(block, iters):
+    replay = deque(maxlen=10 * len(block))
+    tic = time.perf_counter()
+    for _ in range(iters):
+        received = pickle.loads(pickle.dumps(block, protocol=pickle.HIGHEST_PROTOCOL))
+        replay.extend(received)
+    assert len(received) == len(block)
+    return (time.perf_counter() - tic) / (iters * len(block))
+
+
+def bench_ring(block, iters):
+    max_bytes = len(block) * lz4_bound(8 * 84 * 84)
+    writer = TransitionRing("agent0-bench", 2, len(block), max_bytes, create=True)
+    reader = TransitionRing("agent0-bench", 2, len(block), max_bytes)
+    replay = deque(maxlen=10 * len(block))
+    try:
+        tic = time.perf_counter()
+        for seq in range(iters):
+            writer.write(block, seq)
+            received = reader.read(seq)
+            replay.extend(received)
+        assert len(received) == len(block)
+        return (time.perf_counter() - tic) / (iters * len(block))
+    finally:
+        reader.close()
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_items", type=int, default=1280)
+    parser.add_argument("--iters", type=int, default=20)
+    args = parser.parse_args()
+
+    block = make_block(args.num_items)
+    for name, fn in (("pickle", bench_pickle), ("shm ring", bench_ring)):
+        per_frame = fn(block, args.iters)
+        print(f"{name:>8}: {per_frame * 1e6:.2f} us/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
+import time
 from collections import deque
 
 import gymnasium as gym
 import numpy as np
 from gymnasium.core import Env
+from gymnasium.spaces import Box, Discrete
 from gymnasium.wrappers import (AtariPreprocessing, FrameStack,
                                 RecordEpisodeStatistics)
 
@@ -55,14 +57,92 @@ class EpisodicLifeEnv(gym.Wrapper):
         return obs, reward, done, trunc, info
 
 
-def make_atari(env_id, num_envs, episode_life=True):
-    wrappers = [
-        lambda x: AtariPreprocessing(x, terminal_on_life_loss=False),
-        lambda x: FrameStack(x, 4, False),
-        lambda x: EpisodicLifeEnv(x) if episode_life else x,
-        FireResetEnv,
-        RecordEpisodeStatistics,
-        ClipRewardEnv,
-    ]
-    envs = gym.make_vec(f"{env_id}NoFrameskip-v4", num_envs, wrappers=wrappers)
+class SyntheticAtariEnv(Env):
+    """ROM-free stand-in for a preprocessed Atari game, for throughput tests.
+
+    Emits 84x84 uint8 frames like AtariPreprocessing, burns ``step_cost``
+    seconds of CPU per step to mimic the emulator, loses a life every
+    ``life_loss_freq`` steps and ends the game after ``episode_length`` steps.
+    ``frame_entropy`` is the fraction of pixels redrawn per step, which sets how
+    well the frames compress.
+    """
+
+    metadata = {"render_modes": []}
+
+    def __init__(
+        self,
+        action_dim=6,
+        episode_length=1000,
+        life_loss_freq=200,
+        step_cost=0.0,
+        frame_entropy=0.05,
+        reward_prob=0.05,
+        render_mode=None,
+    ):
+        self.observation_space = Box(0, 255, (84, 84), np.uint8)
+        self.action_space = Discrete(action_dim)
+        self.episode_length = episode_length
+        self.life_loss_freq = life_loss_freq
+        self.step_cost = step_cost
+        self.frame_entropy = frame_entropy
+        self.reward_prob = reward_prob
+        self.render_mode = render_mode
+        self.frame = np.zeros((84, 84), dtype=np.uint8)
+        self.steps = 0
+
+    def reset(self, *, seed=None, options=None):
+        super().reset(seed=seed)
+        self.steps = 0
+        # Low-valued background, similar to a mostly dark Atari screen.
+        self.frame = self.np_random.integers(0, 16, (84, 84), dtype=np.uint8)
+        return self.frame.copy(), {"life_loss": False}
+
+    def step(self, action):
+        if self.step_cost > 0:
+            deadline = time.perf_counter() + self.step_cost
+            while time.perf_counter() < deadline:
+                pass
+
+        self.steps += 1
+        num_pixels = int(self.frame_entropy * self.frame.size)
+        if num_pixels > 0:
+            ids = self.np_random.integers(0, self.frame.size, num_pixels)
+            self.frame.flat[ids] = self.np_random.integers(0, 256, num_pixels)
+
+        reward = float(self.np_random.random() < self.reward_prob)
+        terminated = self.steps >= self.episode_length
+        life_loss = (
+            not terminated
+            and self.life_loss_freq > 0
+            and self.steps % self.life_loss_freq == 0
+        )
+        return self.frame.copy(), reward, terminated, False, {"life_loss": life_loss}
+
+
+gym.register(
+    id="SyntheticNoFrameskip-v4",
+    entry_point="agent0.common.atari_wrappers:SyntheticAtariEnv",
+)
+
+
+def make_atari(env_id, num_envs, episode_life=True, **kwargs):
+    if env_id == "Synthetic":
+        # Frames are already preprocessed and life loss is reported by the env.
+        wrappers = [
+            lambda x: FrameStack(x, 4, False),
+            RecordEpisodeStatistics,
+            ClipRewardEnv,
+        ]
+    else:
+        wrappers = [
+            lambda x: AtariPreprocessing(x, terminal_on_life_loss=False),
+            lambda x: FrameStack(x, 4, False),
+            lambda x: EpisodicLifeEnv(x) if episode_life else x,
+            FireResetEnv,
+            RecordEpisodeStatistics,
+            ClipRewardEnv,
+        ]
+    envs = gym.make_vec(
+        f"{env_id}NoFrameskip-v4", num_envs, wrappers=wrappers, **kwargs
+    )
     return envs
@@ -0,0 +1,190 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+
+import torch
+
+
+def snapshot(state):
+    # Detached CPU copy of a (nested) state dict, safe to write from another thread
+    # while training keeps updating the originals.
+    if torch.is_tensor(state):
+        return state.detach().to("cpu", copy=True)
+    if isinstance(state, dict):
+        return {k: snapshot(v) for k, v in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(snapshot(v) for v in state)
+    return state
+
+
+def fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def save_atomic(obj, path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        torch.save(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def checkpoint_dirs(path):
+    # Oldest first; unfinished .tmp directories are not checkpoints.
+    dirs = sorted(glob.glob(os.path.join(path, "ckpt-*")))
+    return [d for d in dirs if not d.endswith(".tmp")]
+
+
+def latest_checkpoint(path):
+    """Resolve a checkpoint directory, or the newest one under ``path``."""
+    if os.path.exists(os.path.join(path, "manifest.json")):
+        return path
+    latest = os.path.join(path, "latest")
+    if os.path.exists(latest):
+        with open(latest) as f:
+            return os.path.join(path, f.read().strip())
+    dirs = checkpoint_dirs(path)
+    if len(dirs) == 0:
+        raise FileNotFoundError(f"No checkpoint found in {path}")
+    return dirs[-1]
+
+
+def load_checkpoint(path, map_location=None):
+    path = latest_checkpoint(path)
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    state = {
+        name: torch.load(os.path.join(path, file), map_location=map_location)
+        for name, file in manifest["files"].items()
+    }
+    return path, manifest["step"], state
+
+
+def load_model_state(path):
+    """Model weights from a checkpoint directory, a model.pt or a best.pth.
+
+    The file is memory mapped, so weights are paged in when they are first used
+    instead of being read in full before the model can run.
+    """
+    if os.path.isdir(path):
+        path = os.path.join(latest_checkpoint(path), "model.pt")
+    state = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    # best.pth wraps the weights together with its test returns.
+    return state["model"] if "model" in state else state
+
+
+class Checkpointer:
+    """Writes checkpoints to ``directory`` from a background thread.
+
+    ``save`` snapshots every component on the calling thread and returns; the
+    writer puts each one in its own file under ``ckpt-<step>.tmp`` and renames
+    the directory once everything is on disk, so a crash never leaves a
+    partial ``ckpt-<step>``. A component whose version matches the previously
+    saved one is hard linked from the last checkpoint instead of being copied
+    and written again. Only the newest ``keep`` checkpoints are kept, and
+    ``latest`` names the most recent one.
+    """
+
+    def __init__(self, directory, keep=3):
+        self.directory = directory
+        self.keep = keep
+        # One pending checkpoint at most: a slow disk throttles save, not memory.
+        self.queue = queue.Queue(maxsize=1)
+        self.versions = {}
+        self.files = {}
+        self.closed = False
+        os.makedirs(directory, exist_ok=True)
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def save(self, step, state, versions=None):
+        # state: name -> callable returning the state dict; only called when the
+        # component changed since the last checkpoint.
+        versions = versions or {}
+        payload = {}
+        for name, get_state in state.items():
+            version = versions.get(name)
+            if version is not None and self.versions.get(name) == version:
+                payload[name] = None
+            else:
+                payload[name] = snapshot(get_state())
+                self.versions[name] = version
+        self.queue.put(("checkpoint", step, payload))
+
+    def save_file(self, path, state):
+        # A standalone file written by the same thread, e.g. best.pth.
+        self.queue.put(("file", path, snapshot(state)))
+
+    def loop(self):
+        while True:
+            item = self.queue.get()
+            if item[0] == "close":
+                return
+            try:
+                if item[0] == "checkpoint":
+                    self.write(item[1], item[2])
+                else:
+                    save_atomic(item[2], item[1])
+            except Exception:
+                # Forget what was written so the next checkpoint writes every file.
+                self.versions, self.files = {}, {}
+                logging.getLogger("agent0").exception("Failed to write checkpoint")
+
+    def write(self, step, payload):
+        name = f"ckpt-{step:012d}"
+        final = os.path.join(self.directory, name)
+        tmp = f"{final}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        files = {}
+        for key, state in payload.items():
+            files[key] = f"{key}.pt"
+            path = os.path.join(tmp, files[key])
+            if state is None:
+                try:
+                    os.link(self.files[key], path)
+                except OSError:
+                    shutil.copy2(self.files[key], path)
+                continue
+            with open(path, "wb") as f:
+                torch.save(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+        with open(os.path.join(tmp, "manifest.json"), "w") as f:
+            json.dump(dict(step=step, files=files), f)
+            f.flush()
+            os.fsync(f.fileno())
+        fsync_dir(tmp)
+
+        shutil.rmtree(final, ignore_errors=True)
+        os.rename(tmp, final)
+        fsync_dir(self.directory)
+        self.files = {key: os.path.join(final, file) for key, file in files.items()}
+
+        latest = os.path.join(self.directory, "latest")
+        with open(f"{latest}.tmp", "w") as f:
+            f.write(name)
+        os.replace(f"{latest}.tmp", latest)
+
+        if self.keep > 0:
+            for old in checkpoint_dirs(self.directory)[: -self.keep]:
+                shutil.rmtree(old, ignore_errors=True)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(("close",))
+        self.thread.join()
@@ -0,0 +1,47 @@
+import json
+import os
+
+# Bump when make_atari's wrappers change the observation or action space.
+SPEC_VERSION = 1
+
+
+def cache_path():
+    cache_dir = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.path.join(cache_dir, "agent0", "env_specs.json")
+
+
+def env_spec(env_id, **kwargs):
+    """``(obs_shape, action_dim)`` of ``make_atari(env_id, **kwargs)`` envs.
+
+    Specs are cached on disk, so entry points only construct a probe env (and
+    import gymnasium and the emulator) the first time they see an env.
+    """
+    key = dict(env_id=env_id, version=SPEC_VERSION, **kwargs)
+    key = json.dumps(key, sort_keys=True)
+    path = cache_path()
+    try:
+        with open(path) as f:
+            specs = json.load(f)
+    except (OSError, ValueError):
+        specs = {}
+
+    if key not in specs:
+        from agent0.common.atari_wrappers import make_atari
+
+        envs = make_atari(env_id, 1, **kwargs)
+        specs[key] = dict(
+            obs_shape=list(envs.observation_space.shape[1:]),
+            action_dim=int(envs.action_space[0].n),
+        )
+        envs.close()
+        try:
+            # Written atomically; concurrent writers at worst drop each other's keys.
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f"{path}.{os.getpid()}", "w") as f:
+                json.dump(specs, f, indent=2)
+            os.replace(f"{path}.{os.getpid()}", path)
+        except OSError:
+            pass
+
+    spec = specs[key]
+    return tuple(spec["obs_shape"]), spec["action_dim"]
@@ -0,0 +1,113 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+
+class MetricsSink:
+    """Writes metrics to TensorBoard, wandb and the file logger off the hot loop.
+
+    Scalars, histograms, videos and log messages are queued by the caller and
+    written by a background thread every ``flush_secs``. All wandb metrics that
+    share a step go out in a single commit. ``close`` (also registered with
+    ``atexit``) drains everything still queued before it returns.
+    """
+
+    def __init__(self, logdir, use_tb, use_wandb, logger, flush_secs=2.0):
+        # Backends are imported only when enabled; both are slow to import.
+        self.writer = None
+        if use_tb:
+            from tensorboardX import SummaryWriter
+
+            self.writer = SummaryWriter(logdir)
+        self.wandb = None
+        if use_wandb:
+            import wandb
+
+            self.wandb = wandb
+        self.logger = logger
+        self.flush_secs = flush_secs
+        self.queue = queue.Queue()
+        self.closed = False
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def scalar(self, key, value, step):
+        self.queue.put(("scalar", key, value, step))
+
+    def scalars(self, values, step):
+        for key, value in values.items():
+            if value is not None:
+                self.scalar(key, value, step)
+
+    def histogram(self, key, values, step):
+        self.queue.put(("histogram", key, values, step))
+
+    def video(self, key, video, step, fps=60):
+        self.queue.put(("video", key, (video, fps), step))
+
+    def info(self, msg):
+        self.queue.put(("info", None, msg, None))
+
+    def loop(self):
+        pending = []
+        deadline = time.time() + self.flush_secs
+        while True:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                item = None
+
+            if item is not None and item[0] == "close":
+                self.write(pending)
+                return
+            if item is not None:
+                pending.append(item)
+            if time.time() >= deadline:
+                self.write(pending)
+                pending = []
+                deadline = time.time() + self.flush_secs
+
+    def write(self, items):
+        try:
+            commits = defaultdict(dict)
+            for kind, key, value, step in items:
+                if kind == "info":
+                    self.logger.info(value)
+                elif kind == "scalar":
+                    if self.writer is not None:
+                        self.writer.add_scalar(key, value, step)
+                    commits[step][key] = value
+                elif kind == "histogram":
+                    if self.writer is not None:
+                        self.writer.add_histogram(key, value, step)
+                    if self.wandb is not None:
+                        commits[step][key] = self.wandb.Histogram(value)
+                elif kind == "video":
+                    video, fps = value
+                    if self.writer is not None:
+                        self.writer.add_video(key, video, step, fps=fps)
+                    if self.wandb is not None:
+                        video = self.wandb.Video(video, fps=fps, format="mp4")
+                        commits[step][key] = video
+
+            if self.wandb is not None:
+                for step in sorted(commits):
+                    self.wandb.log({**commits[step], "frame": step})
+            if self.writer is not None:
+                self.writer.flush()
+        except Exception:
+            # A failing backend must not take the training run down with it.
+            logging.getLogger("agent0").exception("Failed to write metrics")
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(("close", None, None, None))
+        self.thread.join()
+        if self.writer is not None:
+            self.writer.close()
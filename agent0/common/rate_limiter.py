@@ -0,0 +1,67 @@
+class RateLimiter:
+    """Keeps the samples-per-insert ratio inside an error band.
+
+    Follows Reverb's ``SampleToInsertRatio``: with ``I`` inserted and ``S``
+    sampled items, the quantity ``I * samples_per_insert - S`` must stay within
+    ``samples_per_insert * min_size_to_sample +/- error_buffer``. Inserts are
+    unrestricted until ``min_size_to_sample`` items are in the replay, and
+    sampling is not allowed before that.
+    """
+
+    def __init__(self, samples_per_insert, min_size_to_sample, error_buffer):
+        self.samples_per_insert = samples_per_insert
+        self.min_size_to_sample = min_size_to_sample
+        offset = samples_per_insert * min_size_to_sample
+        self.min_diff = offset - error_buffer
+        self.max_diff = offset + error_buffer
+
+        self.inserts = 0
+        self.samples = 0
+        self.insert_stall = 0.0
+        self.sample_stall = 0.0
+
+    def check_block_sizes(self, insert_size, sample_size):
+        # If neither side may proceed both would wait forever, so the band has to
+        # fit one insert block plus one sample batch.
+        band = self.max_diff - self.min_diff
+        if band < insert_size * self.samples_per_insert + sample_size:
+            raise ValueError(
+                f"Error band {band} is too narrow for "
+                f"inserts of {insert_size} and samples of {sample_size} at "
+                f"samples_per_insert={self.samples_per_insert}"
+            )
+
+    def diff(self):
+        return self.inserts * self.samples_per_insert - self.samples
+
+    def can_insert(self, num_items):
+        if self.inserts + num_items <= self.min_size_to_sample:
+            return True
+        diff = (self.inserts + num_items) * self.samples_per_insert - self.samples
+        return diff <= self.max_diff
+
+    def can_sample(self, num_items):
+        if self.inserts < self.min_size_to_sample:
+            return False
+        return self.diff() - num_items >= self.min_diff
+
+    def insert(self, num_items):
+        self.inserts += num_items
+
+    def sample(self, num_items):
+        self.samples += num_items
+
+    def ratio(self):
+        inserts = self.inserts - self.min_size_to_sample
+        return self.samples / inserts if inserts > 0 else None
+
+    def stats(self):
+        # Stall times are reported per logging interval.
+        result = dict(
+            spi_achieved=self.ratio(),
+            insert_stall=self.insert_stall,
+            sample_stall=self.sample_stall,
+        )
+        self.insert_stall = 0.0
+        self.sample_stall = 0.0
+        return result
@@ -0,0 +1,104 @@
+import os
+
+import torch
+
+THREAD_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+class Slot:
+    """CPUs and thread budget assigned to one process."""
+
+    def __init__(self, name, cpus, threads, data_cpus=()):
+        self.name = name
+        self.cpus = list(cpus)
+        self.threads = threads
+        self.data_cpus = list(data_cpus)
+
+    def __repr__(self):
+        msg = f"{self.name}: cpus {format_cpus(self.cpus)} | threads {self.threads}"
+        if len(self.data_cpus) > 0:
+            msg += f" | data workers on {format_cpus(self.data_cpus)}"
+        return msg
+
+
+def parse_cpus(text):
+    # "0-3,8,10-11" -> [0, 1, 2, 3, 8, 10, 11]; empty means the current affinity.
+    if text == "":
+        return sorted(os.sched_getaffinity(0))
+    cpus = []
+    for part in text.split(","):
+        lo, _, hi = part.partition("-")
+        cpus.extend(range(int(lo), int(hi or lo) + 1))
+    return cpus
+
+
+def format_cpus(cpus):
+    ranges, start = [], None
+    for i, cpu in enumerate(cpus):
+        if start is None:
+            start = cpu
+        if i + 1 == len(cpus) or cpus[i + 1] != cpu + 1:
+            ranges.append(f"{start}" if start == cpu else f"{start}-{cpu}")
+            start = None
+    return ",".join(ranges)
+
+
+def plan_resources(
+    cpus,
+    num_actors,
+    actor_workers,
+    data_workers,
+    trainer_cpus=0,
+    learner_threads=0,
+    actor_threads=1,
+    first_rank=0,
+):
+    """Split ``cpus`` between the trainer and ``num_actors`` actor processes.
+
+    Each actor needs a core for itself plus one per env worker process, the
+    trainer one per DataLoader worker plus at least two for the learner. Without
+    an explicit ``trainer_cpus`` the cores are divided in proportion to that
+    demand. Actors get contiguous slices, and share cores round-robin when there
+    are more actors than cores.
+    """
+    total = len(cpus)
+    if trainer_cpus <= 0:
+        trainer_demand = max(learner_threads, 2) + data_workers
+        demand = trainer_demand + num_actors * (1 + actor_workers)
+        trainer_cpus = max(round(total * trainer_demand / demand), data_workers + 1)
+    trainer_cpus = max(1, min(trainer_cpus, total - min(num_actors, total - 1)))
+
+    own = cpus[:trainer_cpus]
+    data_cpus = own[-data_workers:] if 0 < data_workers < len(own) else own
+    if learner_threads <= 0:
+        learner_threads = max(len(own) - data_workers, 1)
+    plan = {"trainer": Slot("trainer", own, learner_threads, data_cpus)}
+
+    rest = cpus[trainer_cpus:] or own
+    for i in range(num_actors):
+        if num_actors <= len(rest):
+            lo, hi = i * len(rest) // num_actors, (i + 1) * len(rest) // num_actors
+            share = rest[lo:hi]
+        else:
+            share = [rest[i % len(rest)]]
+        name = f"actor-{first_rank + i}"
+        plan[name] = Slot(name, share, actor_threads)
+    return plan
+
+
+def format_plan(plan):
+    return "\n".join(f"  {slot}" for slot in plan.values())
+
+
+def apply_slot(slot):
+    # Child processes (env and DataLoader workers) inherit both the affinity
+    # and the variables; torch in this process is configured directly.
+    os.sched_setaffinity(0, slot.cpus)
+    for var in THREAD_VARS:
+        os.environ[var] = str(slot.threads)
+    torch.set_num_threads(slot.threads)
+
+
+def pin_worker(cpus, worker_id):
+    # DataLoader worker_init_fn: one core per worker from the trainer's data cpus.
+    os.sched_setaffinity(0, [cpus[worker_id % len(cpus)]])
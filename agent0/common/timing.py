@@ -0,0 +1,67 @@
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+import torch
+
+_DISABLED = nullcontext()
+
+
+class _Span:
+    __slots__ = ("timer", "name", "tic")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.tic = time.perf_counter()
+
+    def __exit__(self, *exc):
+        if self.timer.sync:
+            torch.cuda.synchronize()
+        self.timer.totals[self.name] += time.perf_counter() - self.tic
+        self.timer.counts[self.name] += 1
+
+
+class PhaseTimer:
+    """Per-process wall-clock breakdown of the hot path.
+
+    ``with timer.phase("forward"): ...`` accumulates time per phase. While
+    disabled, ``phase`` hands back a shared no-op context manager, so leaving
+    the instrumentation in place costs next to nothing. With ``sync`` the CUDA
+    stream is synchronized at the end of every span, so asynchronous kernels are
+    charged to the phase that launched them.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.sync = False
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.since = time.perf_counter()
+
+    def configure(self, enabled, sync=False):
+        self.enabled = enabled
+        self.sync = enabled and sync and torch.cuda.is_available()
+        self.flush()
+
+    def phase(self, name):
+        if not self.enabled:
+            return _DISABLED
+        return _Span(self, name)
+
+    def flush(self):
+        # Seconds spent per phase since the previous flush, plus the wall time.
+        now = time.perf_counter()
+        result = {}
+        if self.enabled:
+            result = {f"t_{k}": v for k, v in self.totals.items()}
+            result["t_wall"] = now - self.since
+        self.totals.clear()
+        self.counts.clear()
+        self.since = now
+        return result
+
+
+timer = PhaseTimer()
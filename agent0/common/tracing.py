@@ -0,0 +1,153 @@
+import argparse
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+_DISABLED = nullcontext()
+
+
+def now_us():
+    # Wall clock, so spans from different processes on one host line up.
+    return time.time_ns() // 1000
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "tic")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.tic = now_us()
+
+    def __exit__(self, *exc):
+        event = dict(name=self.name, ph="X", ts=self.tic, dur=now_us() - self.tic)
+        if self.args:
+            event["args"] = self.args
+        self.tracer.emit(event)
+
+
+class Tracer:
+    """Chrome trace-event writer for one process.
+
+    Events are streamed to ``path`` in the JSON array format, which viewers
+    accept without the closing bracket, so a crashed process still leaves a
+    readable file. Use ``python -m agent0.common.tracing`` to merge the files of
+    a run into a single timeline for chrome://tracing or ui.perfetto.dev.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.file = None
+        self.events = []
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def configure(self, path, process_name, buffer_size=1024):
+        self.close()
+        if path is None:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.enabled = True
+        self.buffer_size = buffer_size
+        self.pid = os.getpid()
+        self.file = open(path, "w")
+        self.file.write("[\n")
+        self.emit(dict(name="process_name", ph="M", args={"name": process_name}))
+        atexit.register(self.close)
+
+    def span(self, name, **args):
+        if not self.enabled:
+            return _DISABLED
+        return _Span(self, name, args)
+
+    def instant(self, name, **args):
+        if self.enabled:
+            self.emit(dict(name=name, ph="i", s="p", ts=now_us(), args=args))
+
+    def counter(self, name, **values):
+        if self.enabled:
+            self.emit(dict(name=name, ph="C", ts=now_us(), args=values))
+
+    def flow(self, name, flow_id, start):
+        # Arrow from the span enclosing the start to the one enclosing the end.
+        if self.enabled:
+            event = dict(name=name, cat="flow", id=flow_id, ts=now_us(), ph="s")
+            if not start:
+                event.update(ph="f", bp="e")
+            self.emit(event)
+
+    def emit(self, event):
+        event.update(pid=self.pid, tid=threading.get_native_id())
+        with self.lock:
+            self.events.append(event)
+            if len(self.events) >= self.buffer_size:
+                self._write()
+
+    def _write(self):
+        for event in self.events:
+            self.file.write(json.dumps(event) + ",\n")
+        self.file.flush()
+        self.events.clear()
+
+    def flush(self):
+        if self.enabled:
+            with self.lock:
+                self._write()
+
+    def close(self):
+        if not self.enabled:
+            return
+        self.flush()
+        self.enabled = False
+        self.file.close()
+        self.file = None
+
+
+tracer = Tracer()
+
+
+def load_events(path):
+    with open(path) as f:
+        text = f.read().strip().rstrip(",")
+    if text.startswith("{"):
+        return json.loads(text)["traceEvents"]
+    if not text.endswith("]"):
+        text += "]"
+    return json.loads(text)
+
+
+def merge(paths, output):
+    events = []
+    for path in paths:
+        events.extend(load_events(path))
+    # Shift the timeline to start at zero; metadata events carry no timestamp.
+    start = min((e["ts"] for e in events if "ts" in e), default=0)
+    for e in events:
+        if "ts" in e:
+            e["ts"] -= start
+    with open(output, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return len(events)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge per-process trace files")
+    parser.add_argument("inputs", nargs="+", help="trace files or directories")
+    parser.add_argument("-o", "--output", default="timeline.json")
+    args = parser.parse_args()
+
+    paths = []
+    for item in args.inputs:
+        if os.path.isdir(item):
+            paths.extend(sorted(glob.glob(os.path.join(item, "*.json"))))
+        else:
+            paths.append(item)
+    num_events = merge(paths, args.output)
+    print(f"Merged {num_events} events from {len(paths)} files into {args.output}")
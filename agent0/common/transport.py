@@ -0,0 +1,174 @@
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def lz4_bound(size):
+    return size + size // 255 + 16
+
+
+class TransitionBlock:
+    """Columns of one block read from a ring.
+
+    Iterates as ``(frames, action, reward, done)`` tuples, so it can go straight
+    into ``ReplayDataset.extend``. Frames are slices of a single copy of the
+    block's bytes.
+    """
+
+    def __init__(self, frames, actions, rewards, dones):
+        self.frames = frames
+        self.actions = actions
+        self.rewards = rewards
+        self.dones = dones
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        return zip(
+            self.frames,
+            self.actions.tolist(),
+            self.rewards.tolist(),
+            self.dones.tolist(),
+        )
+
+
+class TransitionRing:
+    """Single-producer/single-consumer ring of columnar transition blocks.
+
+    Each slot holds one block laid out as columns in shared memory: a header
+    (state, count, nbytes, seq), frame offsets, actions, rewards, dones and the
+    concatenated compressed frames. The producer blocks while the next slot is
+    still full, which gives backpressure without any extra channel. Blocks are
+    tagged with a sequence number, so a reader that asks for one skips blocks
+    left over from failed calls.
+    """
+
+    EMPTY = 0
+    FULL = 1
+
+    def __init__(self, name, num_slots, max_items, max_bytes, create=False):
+        self.name = name
+        self.num_slots = num_slots
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.create = create
+
+        slot_size = 8 * (4 + 2 * max_items + 1) + 8 * max_items + max_items
+        self.slot_size = (slot_size + max_bytes + 7) // 8 * 8
+        self.shm = shared_memory.SharedMemory(
+            name=name, create=create, size=num_slots * self.slot_size
+        )
+        self.slots = [self.slot_views(i) for i in range(num_slots)]
+        self.index = 0
+        self.stall_time = 0.0
+
+    def slot_views(self, i):
+        offset = i * self.slot_size
+        views = []
+        for dtype, count in (
+            (np.int64, 4),
+            (np.int64, self.max_items + 1),
+            (np.int64, self.max_items),
+            (np.float64, self.max_items),
+            (np.bool_, self.max_items),
+            (np.uint8, self.max_bytes),
+        ):
+            view = np.ndarray((count,), dtype=dtype, buffer=self.shm.buf, offset=offset)
+            views.append(view)
+            offset += view.nbytes
+        return views
+
+    def wait(self, ready, timeout):
+        tic = time.perf_counter()
+        delay = 1e-4
+        while not ready():
+            if timeout is not None and time.perf_counter() - tic > timeout:
+                raise TimeoutError(f"Ring {self.name} slot not ready")
+            # Backs off, as a slot can stay full for a whole learner step.
+            time.sleep(delay)
+            delay = min(2 * delay, 5e-3)
+        self.stall_time += time.perf_counter() - tic
+
+    def reset(self):
+        # Drops every block; only safe while the other side is idle.
+        for header, *_ in self.slots:
+            header[0] = self.EMPTY
+        self.index = 0
+
+    def write(self, transitions, seq=0, timeout=None):
+        num_items = len(transitions)
+        if num_items > self.max_items:
+            raise ValueError(f"Block of {num_items} exceeds {self.max_items} items")
+        header, offsets, actions, rewards, dones, frames = self.slots[self.index]
+        self.wait(lambda: header[0] == self.EMPTY, timeout)
+
+        frames_t, actions_t, rewards_t, dones_t = zip(*transitions)
+        offsets[0] = 0
+        np.cumsum(
+            np.fromiter(map(len, frames_t), np.int64, num_items),
+            out=offsets[1 : num_items + 1],
+        )
+        nbytes = int(offsets[num_items])
+        if nbytes > self.max_bytes:
+            raise ValueError(f"Block of {nbytes} bytes exceeds {self.max_bytes}")
+
+        # Exactly one copy per frame, straight into shared memory.
+        buf = memoryview(frames)
+        bounds = offsets[: num_items + 1].tolist()
+        for lo, hi, frame in zip(bounds[:-1], bounds[1:], frames_t):
+            buf[lo:hi] = frame
+        actions[:num_items] = actions_t
+        rewards[:num_items] = rewards_t
+        dones[:num_items] = dones_t
+        header[1], header[2], header[3] = num_items, nbytes, seq
+        # Publishing the state last hands the slot over to the consumer.
+        header[0] = self.FULL
+        self.index = (self.index + 1) % self.num_slots
+
+    def find(self, seq):
+        # The slot holding block seq; older blocks are stale and get dropped.
+        for i, (header, *_) in enumerate(self.slots):
+            if header[0] != self.FULL:
+                continue
+            if header[3] == seq:
+                return i
+            if header[3] > seq:
+                raise LookupError(f"Ring {self.name} lost block {seq}")
+            header[0] = self.EMPTY
+        return None
+
+    def read(self, seq=None, timeout=None):
+        """Next block in ring order, or the block tagged ``seq``."""
+        if seq is None:
+            header = self.slots[self.index][0]
+            self.wait(lambda: header[0] == self.FULL, timeout)
+        else:
+            self.wait(lambda: self.find(seq) is not None, timeout)
+            self.index = self.find(seq)
+
+        header, offsets, actions, rewards, dones, frames = self.slots[self.index]
+        num_items, nbytes = int(header[1]), int(header[2])
+        # One copy of the whole block; frames are views into it.
+        data = memoryview(frames[:nbytes].tobytes())
+        bounds = offsets[: num_items + 1].tolist()
+        block = TransitionBlock(
+            [data[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])],
+            actions[:num_items].copy(),
+            rewards[:num_items].copy(),
+            dones[:num_items].copy(),
+        )
+        header[0] = self.EMPTY
+        self.index = (self.index + 1) % self.num_slots
+        return block
+
+    def close(self):
+        self.slots = None
+        self.shm.close()
+        if self.create:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                # The resource tracker of an attached process got there first.
+                pass
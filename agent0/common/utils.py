@@ -1,12 +1,15 @@
 import argparse
 import json
+import math
+import queue
 import random
+import threading
+import time
+from collections import deque
 from enum import Enum
 
 import numpy as np
 import torch
-from prefetch_generator import BackgroundGenerator
-from torch.utils.data import DataLoader
 
 
 class LinearSchedule:
@@ -28,37 +31,205 @@ class LinearSchedule:
         return val
 
 
+class MetricAccumulator:
+    """Accumulates scalar metrics without forcing a host sync.
+
+    Tensor values are summed on their own device and only copied to host when
+    ``flush`` is called, so hot loops can record metrics on every step.
+    """
+
+    def __init__(self):
+        self.sums = {}
+        self.counts = {}
+
+    def add(self, key, value, valid=None):
+        # valid is a device-side bool; a false one leaves value out of the mean.
+        if value is None:
+            return
+        if torch.is_tensor(value):
+            value = value.detach().float().mean()
+        count = 1
+        if valid is not None:
+            value = torch.where(valid, value, 0.0)
+            count = valid.float()
+        if key in self.sums:
+            self.sums[key] = self.sums[key] + value
+            self.counts[key] = self.counts[key] + count
+        else:
+            self.sums[key] = value
+            self.counts[key] = count
+
+    @staticmethod
+    def to_host(values):
+        tensor_keys = [k for k, v in values.items() if torch.is_tensor(v)]
+        result = {k: v for k, v in values.items() if k not in tensor_keys}
+        # One transfer per device instead of one per metric.
+        devices = {values[k].device for k in tensor_keys}
+        for device in devices:
+            keys = [k for k in tensor_keys if values[k].device == device]
+            result.update(zip(keys, torch.stack([values[k] for k in keys]).tolist()))
+        return result
+
+    def flush(self):
+        sums, counts = self.to_host(self.sums), self.to_host(self.counts)
+        result = {
+            k: v / counts[k] if counts[k] > 0 else float("nan") for k, v in sums.items()
+        }
+        self.sums, self.counts = {}, {}
+        return result
+
+
+class WindowStat:
+    """Bounded window statistics plus an all-time running max."""
+
+    def __init__(self, window):
+        self.values = deque(maxlen=window)
+        self.max = -math.inf
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def extend(self, values):
+        for v in values:
+            self.values.append(v)
+            self.max = max(self.max, v)
+            self.count += 1
+
+    def mean(self):
+        return np.mean(self.values) if len(self.values) > 0 else None
+
+    def best(self):
+        return self.max if self.count > 0 else None
+
+
 class DataPrefetcher:
-    def __init__(self, data_loader, device):
-        self.data_loader = iter(data_loader)
-        self.stream = torch.cuda.Stream()
-        self.device = device
-        self.next_data = None
-        self.preload()
-
-    def preload(self):
+    """Keeps up to ``depth`` batches of one pass over a DataLoader on ``device``.
+
+    DataLoader workers sample, decompress and collate, its pin thread pins host
+    memory, and a background thread here copies each batch on a side CUDA
+    stream, so ``next`` usually returns a batch that is already on the device.
+    On CPU the copy stage is a no-op. ``next`` raises StopIteration once the
+    loader is exhausted; time spent blocked in it accumulates in ``stall``.
+    """
+
+    def __init__(self, data_loader, device, depth=2):
+        self.device = torch.device(device)
+        self.stream = None
+        if self.device.type == "cuda":
+            self.stream = torch.cuda.Stream(self.device)
+        self.queue = queue.Queue(maxsize=max(depth, 1))
+        self.stall = 0.0
+        self.closed = False
+        self.thread = threading.Thread(
+            target=self.worker, args=(data_loader,), daemon=True
+        )
+        self.thread.start()
+
+    def worker(self, data_loader):
         try:
-            self.next_data = next(self.data_loader)
+            for batch in data_loader:
+                event = None
+                if self.stream is not None:
+                    with torch.cuda.stream(self.stream):
+                        batch = [x.to(self.device, non_blocking=True) for x in batch]
+                        event = torch.cuda.Event()
+                        event.record(self.stream)
+                if not self.put((batch, event)):
+                    return
+            self.put(StopIteration())
         except Exception as e:
-            raise StopIteration
+            self.put(e)
 
-        # noinspection PyTypeChecker
-        with torch.cuda.stream(self.stream):
-            self.next_data = (
-                x.to(self.device, non_blocking=True) for x in self.next_data
-            )
+    def put(self, item):
+        while not self.closed:
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
 
     def next(self):
-        # noinspection PyTypeChecker
-        torch.cuda.current_stream().wait_stream(self.stream)
-        data = self.next_data
-        self.preload()
-        return data
+        tic = time.perf_counter()
+        item = self.queue.get()
+        self.stall += time.perf_counter() - tic
+        if isinstance(item, Exception):
+            raise item
+        batch, event = item
+        if event is not None:
+            current = torch.cuda.current_stream(self.device)
+            current.wait_event(event)
+            # The side stream allocated these; keep them alive for this stream.
+            for x in batch:
+                x.record_stream(current)
+        return batch
+
+    def pop_stall(self):
+        stall, self.stall = self.stall, 0.0
+        return stall
+
+    def close(self):
+        self.closed = True
+        while self.thread.is_alive():
+            try:
+                self.queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+@torch.no_grad()
+def masked_adam_step(optimizer, keep):
+    """One step of a plain ``torch.optim.Adam`` (no weight decay or amsgrad),
+    leaving parameters and optimizer state untouched where ``keep`` is False.
+
+    ``keep`` is a bool tensor on the parameters' device: 0-d, or one flag per
+    slice of their leading dimension for stacked replicas, which then keep one
+    step count each. The flags only enter the arithmetic, so skipping an update
+    needs neither a host sync nor copies of the state. NaN gradients are zeroed.
+    """
+    keep = keep.float()
+    for group in optimizer.param_groups:
+        params = [p for p in group["params"] if p.grad is not None]
+        if not params:
+            continue
+        for p in params:
+            state = optimizer.state[p]
+            if not state:
+                state["step"] = torch.zeros(keep.shape, device=p.device)
+                state["exp_avg"] = torch.zeros_like(p)
+                state["exp_avg_sq"] = torch.zeros_like(p)
+        states = [optimizer.state[p] for p in params]
+        grads = [p.grad.nan_to_num_(0.0, 0.0, 0.0) for p in params]
+        exp_avgs = [state["exp_avg"] for state in states]
+        exp_avg_sqs = [state["exp_avg_sq"] for state in states]
+        for state in states:
+            state["step"].add_(keep)
 
+        beta1, beta2 = group["betas"]
+        # All parameters share the step count. A slice that has never stepped
+        # has zero moments and weight 0; the clamp only keeps it finite.
+        step = states[0]["step"].clamp(min=1)
+        scales = (
+            keep * (1 - beta1),
+            keep * (1 - beta2),
+            1 - beta2**step,
+            keep * group["lr"] / (1 - beta1**step),
+        )
+        if keep.dim() > 0:
+            scales = [
+                [x.view(x.shape + (1,) * (p.dim() - 1)) for p in params] for x in scales
+            ]
+        w1, w2, bias2, lr = scales
 
-class DataLoaderX(DataLoader):
-    def __iter__(self):
-        return BackgroundGenerator(super().__iter__(), max_prefetch=3)
+        torch._foreach_lerp_(exp_avgs, grads, w1)
+        torch._foreach_lerp_(exp_avg_sqs, torch._foreach_mul(grads, grads), w2)
+        denom = torch._foreach_div(exp_avg_sqs, bias2)
+        torch._foreach_sqrt_(denom)
+        torch._foreach_add_(denom, group["eps"])
+        updates = torch._foreach_div(exp_avgs, denom)
+        torch._foreach_mul_(updates, lr)
+        torch._foreach_sub_(params, updates)
 
 
 def parse_arguments(config):
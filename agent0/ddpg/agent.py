@@ -16,10 +16,17 @@ class Agent:
         self.cfg = Config(**kwargs)
         cfg = self.cfg
         self.device = torch.device("cuda:0")
-        self.env = make_bullet_env(cfg.game, seed=cfg.seed)
+        self.envs = [
+            make_bullet_env(cfg.game, seed=cfg.seed + i) for i in range(cfg.num_envs)
+        ]
+        self.env = self.envs[0]
         self.action_high = self.env.action_space.high[0]
 
-        self.replay = ReplayBuffer(size=cfg.buffer_size)
+        self.replay = ReplayBuffer(
+            size=cfg.buffer_size,
+            seed=cfg.seed,
+            pin_memory=self.device.type == "cuda",
+        )
 
         self.net = {
             "ddpg": DDPGMLP,
@@ -34,14 +41,18 @@ class Agent:
         }
 
         assert self.cfg.algo in self.net
+        kwargs = dict(num_critics=cfg.num_critics) if cfg.algo != "ddpg" else {}
         self.network = self.net[self.cfg.algo](
             self.env.observation_space.shape[0],
             self.env.action_space.shape[0],
             self.action_high,
             cfg.hidden_size,
+            **kwargs,
         ).to(self.device)
         self.network.train()
         self.target_network = copy.deepcopy(self.network)
+        self.params = list(self.network.parameters())
+        self.target_params = list(self.target_network.parameters())
 
         self.actor_optimizer = torch.optim.Adam(
             self.network.get_policy_params(), lr=cfg.p_lr
@@ -51,10 +62,12 @@ class Agent:
         )
 
         self.total_steps = 0
+        self.update_steps = 0
         self.noise_std = torch.tensor(
             self.cfg.action_noise_level * self.action_high
         ).to(self.device)
-        self.state = self.env.reset()
+        self.states = np.stack([env.reset() for env in self.envs])
+        self.episode_rewards = np.zeros(cfg.num_envs)
 
         if self.cfg.algo == "sac":
             self.target_entropy = (
@@ -68,7 +81,7 @@ class Agent:
 
     def act(self, st, random=False, testing=False):
         if random:
-            return self.env.action_space.sample()
+            return np.stack([env.action_space.sample() for env in self.envs])
 
         if self.cfg.algo in ["ddpg", "td3"]:
             action_mean = self.network.act(st)
@@ -78,42 +91,49 @@ class Agent:
             raise ValueError("no such policy")
 
         if testing:
-            return action_mean.squeeze(0).cpu().numpy()
+            return action_mean.cpu().numpy()
         else:
             dist = Normal(action_mean, self.noise_std.expand_as(action_mean))
             return (
-                dist.sample()
-                .clamp(-self.action_high, self.action_high)
-                .squeeze(0)
-                .cpu()
-                .numpy()
+                dist.sample().clamp(-self.action_high, self.action_high).cpu().numpy()
             )
 
     def step(self, testing=False):
-        st = torch.tensor(self.state).float().to(self.device).unsqueeze(0)
+        """Steps every env once, with one batched forward for all actions."""
+        random = not testing and self.total_steps < self.cfg.exploration_steps
+        st = None
+        if not random:
+            st = torch.from_numpy(self.states).float().to(self.device)
         with torch.no_grad():
-            action = self.act(
-                st,
-                random=self.total_steps < self.cfg.exploration_steps,
-                testing=testing,
-            )
-        next_state, reward, done, info = self.env.step(action)
+            actions = self.act(st, random=random, testing=testing)
+
+        next_states = np.empty_like(self.states)
+        rewards = np.empty(self.cfg.num_envs)
+        dones = np.empty(self.cfg.num_envs)
+        rs = []
+        for i, env in enumerate(self.envs):
+            next_states[i], rewards[i], done, info = env.step(actions[i])
+            dones[i] = done
+            self.episode_rewards[i] += rewards[i]
+            if done:
+                rs.append(info.get("real_reward", self.episode_rewards[i]))
+                self.episode_rewards[i] = 0
 
         if not testing:
-            self.total_steps += 1
-            self.replay.add(self.state, action, reward, next_state, int(done))
+            self.total_steps += self.cfg.num_envs
+            self.replay.add_batch(self.states, actions, rewards, next_states, dones)
 
-        self.state = next_state
-        if done:
-            self.state = self.env.reset()
+        # Finished envs start their next episode; the replay keeps the last obs.
+        self.states = next_states
+        for i in np.flatnonzero(dones):
+            self.states[i] = self.envs[i].reset()
 
+        loss = dict()
         if not testing and self.total_steps > self.cfg.exploration_steps:
-            loss = self.train_step()
-        else:
-            loss = dict()
+            loss = self.train_step(self.cfg.utd_ratio * self.cfg.num_envs)
 
-        if "real_reward" in info:
-            loss.update(rs=info["real_reward"])
+        if len(rs) > 0:
+            loss.update(rs=rs)
 
         return loss
 
@@ -127,56 +147,57 @@ class Agent:
                 next_actions_mean, self.noise_std.expand_as(next_actions_mean)
             )
             next_actions = dist.sample().clamp(-self.action_high, self.action_high)
-            target_q1, target_q2 = self.target_network.action_value(
-                next_states, next_actions
+            target_q = self.target_network.min_value(
+                next_states, next_actions, self.cfg.num_target_critics
             )
-            target_q = torch.min(target_q1, target_q2)
             target_q = rewards + (1.0 - terminals) * self.cfg.gamma * target_q.detach()
 
-        current_q1, current_q2 = self.network.action_value(states, actions)
-        value_loss = fx.mse_loss(current_q1, target_q) + fx.mse_loss(
-            current_q2, target_q
-        )
+        # Summed over critics, as each one fits the same target.
+        current_q = self.network.action_value(states, actions)
+        value_loss = (current_q - target_q).pow(2).mean(dim=(1, 2)).sum()
 
         self.critic_optimizer.zero_grad()
         value_loss.backward()
         self.critic_optimizer.step()
-        loss = dict(vloss=value_loss.item())
+        loss = dict(vloss=value_loss.detach())
 
-        if self.total_steps % self.cfg.policy_update_freq == 0:
+        if self.update_steps % self.cfg.policy_update_freq == 0:
+            # The actor follows the first critic only, fed the unscaled policy
+            # output as before the ensemble.
             policy_loss = (
-                self.network.v(torch.cat([states, self.network.p(states)], dim=1))
+                self.network.action_value(states, self.network.p(states), slice(0, 1))
                 .mean()
                 .neg()
             )
             self.actor_optimizer.zero_grad()
             policy_loss.backward()
             self.actor_optimizer.step()
-            loss.update(ploss=policy_loss.item())
+            loss.update(ploss=policy_loss.detach())
         return loss
 
     def train_step_sac(self, states, actions, rewards, next_states, terminals):
         with torch.no_grad():
             next_actions, next_entropies, _ = self.network.act(next_states)
-            target_q1, target_q2 = self.target_network.action_value(
-                next_states, next_actions
-            )
-            target_q = (
-                torch.min(target_q1, target_q2) + self.log_alpha.exp() * next_entropies
+            target_q = self.target_network.min_value(
+                next_states, next_actions, self.cfg.num_target_critics
             )
+            target_q = target_q + self.log_alpha.exp() * next_entropies
             target_q = rewards + (1.0 - terminals) * self.cfg.gamma * target_q.detach()
 
-        current_q1, current_q2 = self.network.action_value(states, actions)
-        value_loss = fx.mse_loss(current_q1, target_q) + fx.mse_loss(
-            current_q2, target_q
-        )
+        # Summed over critics, as each one fits the same target.
+        current_q = self.network.action_value(states, actions)
+        value_loss = (current_q - target_q).pow(2).mean(dim=(1, 2)).sum()
         self.critic_optimizer.zero_grad()
         value_loss.backward()
         self.critic_optimizer.step()
 
         sampled_action, entropy, _ = self.network.act(states)
-        q1, q2 = self.network.action_value(states, sampled_action)
-        q = torch.min(q1, q2)
+        q = self.network.action_value(states, sampled_action)
+        # REDQ trains the actor on the ensemble mean once targets subsample.
+        if self.cfg.num_target_critics < self.cfg.num_critics:
+            q = q.mean(dim=0)
+        else:
+            q = q.min(dim=0).values
         policy_loss = (q + self.log_alpha.exp().detach() * entropy).mean().neg()
         self.actor_optimizer.zero_grad()
         policy_loss.backward()
@@ -190,9 +211,9 @@ class Agent:
         self.alpha_optim.step()
 
         return {
-            "vloss": value_loss.item(),
-            "ploss": policy_loss.item(),
-            "ent_loss": entropy_loss.item(),
+            "vloss": value_loss.detach(),
+            "ploss": policy_loss.detach(),
+            "ent_loss": entropy_loss.detach(),
         }
 
     def train_step_ddpg(self, states, actions, rewards, next_states, terminals):
@@ -215,26 +236,30 @@ class Agent:
         policy_loss.backward()
         self.actor_optimizer.step()
 
-        return {"vloss": value_loss.item(), "ploss": policy_loss.item()}
-
-    def train_step(self):
-        states, actions, rewards, next_states, terminals = map(
-            lambda x: torch.tensor(x).to(self.device).float(),
-            self.replay.sample(self.cfg.batch_size),
-        )
-
-        terminals = terminals.float().view(-1, 1)
-        rewards = rewards.float().view(-1, 1)
-
-        loss = self.step_fn[self.cfg.algo](
-            states, actions, rewards, next_states, terminals
-        )
-
-        for param, target_param in zip(
-            self.network.parameters(), self.target_network.parameters()
-        ):
-            target_param.data.copy_(
-                self.cfg.tau * param.data + (1 - self.cfg.tau) * target_param.data
+        return {"vloss": value_loss.detach(), "ploss": policy_loss.detach()}
+
+    def train_step(self, num_updates=1):
+        """Runs num_updates updates on one sampled block of transitions.
+
+        The block is drawn and moved to the device in one go; each update
+        trains on its own slice of it.
+        """
+        batch_size = self.cfg.batch_size
+        block = [
+            x.to(self.device).view(num_updates, batch_size, -1)
+            for x in self.replay.sample_tensors(num_updates * batch_size)
+        ]
+
+        loss = dict()
+        for states, actions, rewards, next_states, terminals in zip(*block):
+            self.update_steps += 1
+            # Losses stay on the device; TD3 reports ploss on policy updates only.
+            loss.update(
+                self.step_fn[self.cfg.algo](
+                    states, actions, rewards, next_states, terminals
+                )
             )
+            with torch.no_grad():
+                torch._foreach_lerp_(self.target_params, self.params, self.cfg.tau)
 
-        return loss
+        return {k: v.item() for k, v in loss.items()}
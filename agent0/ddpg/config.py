@@ -15,6 +15,8 @@ class Config:
 
     total_steps: int = int(1e6)
     exploration_steps: int = 25000
+    # Envs stepped together; each step collects num_envs transitions.
+    num_envs: int = 1
     test_episodes: int = 20
     save_interval: int = 50000
     action_noise_level: float = 0.1
@@ -23,6 +25,8 @@ class Config:
     # Replay related
     buffer_size: int = int(1e6)
     batch_size: int = 256
+    # Updates per collected transition.
+    utd_ratio: int = 1
 
     # Optimizer related
     optimizer: str = "adam"
@@ -33,6 +37,10 @@ class Config:
 
     # Others
     hidden_size: int = 256
+    # sac/td3 critic ensemble; targets take the min over num_target_critics of
+    # them, drawn per update (REDQ with e.g. 10 and 2, utd_ratio=20).
+    num_critics: int = 2
+    num_target_critics: int = 2
     reversed: bool = False
 
     def update(self):
@@ -62,3 +70,9 @@ class Config:
                     f"No such algo as {self.algo}\n"
                     f"available algos are [ddpg, sac, td3']"
                 )
+
+        if not 0 < self.num_target_critics <= self.num_critics:
+            raise ValueError(
+                "num_target_critics must be in [1, num_critics], "
+                f"got {self.num_target_critics} of {self.num_critics}"
+            )
@@ -1,15 +1,49 @@
-from itertools import chain
-
 import numpy as np
 import torch
 import torch.nn as nn
 from torch.distributions import Normal
 
+from agent0.deepq.model import EnsembleLinear
+
 
 def init(m, gain=1.0):
     if isinstance(m, nn.Conv2d) or isinstance(m, nn.Linear):
         nn.init.orthogonal_(m.weight.data, gain)
         nn.init.zeros_(m.bias.data)
+    elif isinstance(m, EnsembleLinear):
+        for weight in m.weight.data:
+            nn.init.orthogonal_(weight, gain)
+        nn.init.zeros_(m.bias.data)
+
+
+class EnsembleCritic(nn.Module):
+    """``num_critics`` Q-value MLPs, each layer one batched matmul for all of them.
+
+    Maps ``b x in`` to ``k x b x 1``; ``heads`` runs a subset of the critics.
+    """
+
+    def __init__(self, num_inputs, hidden_size, num_critics):
+        super(EnsembleCritic, self).__init__()
+        self.num_critics = num_critics
+        self.layers = nn.ModuleList(
+            [
+                EnsembleLinear(num_inputs, hidden_size, num_critics),
+                EnsembleLinear(hidden_size, hidden_size, num_critics),
+                EnsembleLinear(hidden_size, 1, num_critics),
+            ]
+        )
+
+    def forward(self, x, heads=None):
+        for layer in self.layers[:-1]:
+            x = torch.tanh(layer(x, heads))
+        return self.layers[-1](x, heads)
+
+    def min_value(self, x, num_min):
+        """Min over ``num_min`` randomly chosen critics (all when it covers them)."""
+        heads = None
+        if num_min < self.num_critics:
+            heads = torch.randperm(self.num_critics, device=x.device)[:num_min]
+        return self(x, heads).min(dim=0).values
 
 
 class DDPGMLP(nn.Module):
@@ -54,24 +88,12 @@ class SACMLP(nn.Module):
     LOG_STD_MIN = -20
     eps = 1e-6
 
-    def __init__(self, num_inputs, action_dim, max_action, hidden_size=256):
+    def __init__(
+        self, num_inputs, action_dim, max_action, hidden_size=256, num_critics=2
+    ):
         super(SACMLP, self).__init__()
         self.max_action = max_action
-        self.v = nn.Sequential(
-            nn.Linear(num_inputs + action_dim, hidden_size),
-            nn.Tanh(),
-            nn.Linear(hidden_size, hidden_size),
-            nn.Tanh(),
-            nn.Linear(hidden_size, 1),
-        )
-
-        self.v2 = nn.Sequential(
-            nn.Linear(num_inputs + action_dim, hidden_size),
-            nn.Tanh(),
-            nn.Linear(hidden_size, hidden_size),
-            nn.Tanh(),
-            nn.Linear(hidden_size, 1),
-        )
+        self.v = EnsembleCritic(num_inputs + action_dim, hidden_size, num_critics)
 
         self.p = nn.Sequential(
             nn.Linear(num_inputs, hidden_size),
@@ -96,36 +118,26 @@ class SACMLP(nn.Module):
 
         return action, entropy, action_mean.tanh() * self.max_action
 
-    def action_value(self, state, action):
-        x = torch.cat([state, action], dim=1)
-        return self.v(x), self.v2(x)
+    def action_value(self, state, action, heads=None):
+        return self.v(torch.cat([state, action], dim=1), heads)
+
+    def min_value(self, state, action, num_min):
+        return self.v.min_value(torch.cat([state, action], dim=1), num_min)
 
     def get_policy_params(self):
         return self.p.parameters()
 
     def get_value_params(self):
-        return chain(self.v.parameters(), self.v2.parameters())
+        return self.v.parameters()
 
 
 class TD3MLP(nn.Module):
-    def __init__(self, num_inputs, action_dim, max_action, hidden_size=256):
+    def __init__(
+        self, num_inputs, action_dim, max_action, hidden_size=256, num_critics=2
+    ):
         super(TD3MLP, self).__init__()
         self.max_action = max_action
-        self.v = nn.Sequential(
-            nn.Linear(num_inputs + action_dim, hidden_size),
-            nn.Tanh(),
-            nn.Linear(hidden_size, hidden_size),
-            nn.Tanh(),
-            nn.Linear(hidden_size, 1),
-        )
-
-        self.v2 = nn.Sequential(
-            nn.Linear(num_inputs + action_dim, hidden_size),
-            nn.Tanh(),
-            nn.Linear(hidden_size, hidden_size),
-            nn.Tanh(),
-            nn.Linear(hidden_size, 1),
-        )
+        self.v = EnsembleCritic(num_inputs + action_dim, hidden_size, num_critics)
 
         self.p = nn.Sequential(
             nn.Linear(num_inputs, hidden_size),
@@ -141,12 +153,14 @@ class TD3MLP(nn.Module):
     def act(self, x):
         return self.p(x) * self.max_action
 
-    def action_value(self, state, action):
-        x = torch.cat([state, action], dim=1)
-        return self.v(x), self.v2(x)
+    def action_value(self, state, action, heads=None):
+        return self.v(torch.cat([state, action], dim=1), heads)
+
+    def min_value(self, state, action, num_min):
+        return self.v.min_value(torch.cat([state, action], dim=1), num_min)
 
     def get_policy_params(self):
         return self.p.parameters()
 
     def get_value_params(self):
-        return chain(self.v.parameters(), self.v2.parameters())
+        return self.v.parameters()
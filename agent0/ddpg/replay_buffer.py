@@ -1,10 +1,9 @@
-import random
-
 import numpy as np
+import torch
 
 
 class ReplayBuffer(object):
-    def __init__(self, size):
+    def __init__(self, size, seed=None, pin_memory=False):
         """Create Replay buffer.
 
         Parameters
@@ -12,44 +11,85 @@ class ReplayBuffer(object):
         size: int
             Max number of transitions to store in the buffer. When the buffer
             overflows the old memories are dropped.
+        seed: int
+            Seed of the generator that draws sample indexes.
+        pin_memory: bool
+            Allocate the sample buffers in pinned memory, for faster copies to
+            the GPU.
         """
-        self._storage = []
         self._maxsize = size
         self._next_idx = 0
+        self._size = 0
+        self._rng = np.random.default_rng(seed)
+        self._pin_memory = pin_memory
+        # Columns are float32 arrays of `size` rows, allocated on the first add
+        # once the observation and action dims are known.
+        self._storage = None
+        self._batch = None
 
     def __len__(self):
-        return len(self._storage)
+        return self._size
 
-    def add(self, obs_t, action, reward, obs_tp1, done):
-        data = (obs_t, action, reward, obs_tp1, done)
+    def _allocate(self, obs_t, action):
+        obs_dim, action_dim = np.shape(obs_t), np.shape(action)
+        shapes = (obs_dim, action_dim, (), obs_dim, ())
+        self._storage = tuple(
+            np.empty((self._maxsize, *shape), dtype=np.float32) for shape in shapes
+        )
 
-        if self._next_idx >= len(self._storage):
-            self._storage.append(data)
-        else:
-            self._storage[self._next_idx] = data
+    def add(self, obs_t, action, reward, obs_tp1, done):
+        if self._storage is None:
+            self._allocate(obs_t, action)
+        obses_t, actions, rewards, obses_tp1, dones = self._storage
+        i = self._next_idx
+        obses_t[i] = obs_t
+        actions[i] = action
+        rewards[i] = reward
+        obses_tp1[i] = obs_tp1
+        dones[i] = done
         self._next_idx = (self._next_idx + 1) % self._maxsize
+        self._size = min(self._size + 1, self._maxsize)
+
+    def add_batch(self, obs_t, action, reward, obs_tp1, done):
+        """Add one transition per row, e.g. one step of several envs."""
+        if self._storage is None:
+            self._allocate(obs_t[0], action[0])
+        n = len(obs_t)
+        idxes = (self._next_idx + np.arange(n)) % self._maxsize
+        for column, values in zip(
+            self._storage, (obs_t, action, reward, obs_tp1, done)
+        ):
+            column[idxes] = values
+        self._next_idx = (self._next_idx + n) % self._maxsize
+        self._size = min(self._size + n, self._maxsize)
+
+    def _batch_buffers(self, batch_size):
+        # One set of output tensors per batch size, refilled by every sample.
+        # The numpy views share their memory, so sample_tensors needs no copy.
+        if self._batch is None or len(self._batch[0]) != batch_size:
+            tensors = tuple(
+                torch.empty(
+                    (batch_size, *column.shape[1:]),
+                    dtype=torch.float32,
+                    pin_memory=self._pin_memory,
+                )
+                for column in self._storage
+            )
+            self._batch = tensors, tuple(t.numpy() for t in tensors)
+        return self._batch
 
     def _encode_sample(self, idxes):
-        obses_t, actions, rewards, obses_tp1, dones = [], [], [], [], []
-        for i in idxes:
-            data = self._storage[i]
-            obs_t, action, reward, obs_tp1, done = data
-            obses_t.append(np.array(obs_t, copy=False))
-            actions.append(np.array(action, copy=False))
-            rewards.append(reward)
-            obses_tp1.append(np.array(obs_tp1, copy=False))
-            dones.append(done)
-        return (
-            np.array(obses_t),
-            np.array(actions),
-            np.array(rewards),
-            np.array(obses_tp1),
-            np.array(dones),
-        )
+        tensors, arrays = self._batch_buffers(len(idxes))
+        for column, out in zip(self._storage, arrays):
+            np.take(column, idxes, axis=0, out=out)
+        return tensors, arrays
 
     def sample(self, batch_size, beta=None):
         """Sample a batch of experiences.
 
+        The returned arrays are reused by the next call with the same batch
+        size; copy them to keep a batch around.
+
         Parameters
         ----------
         batch_size: int
@@ -69,5 +109,10 @@ class ReplayBuffer(object):
             done_mask[i] = 1 if executing act_batch[i] resulted in
             the end of an episode and 0 otherwise.
         """
-        idxes = [random.randint(0, len(self._storage) - 1) for _ in range(batch_size)]
-        return self._encode_sample(idxes)
+        idxes = self._rng.integers(0, self._size, batch_size)
+        return self._encode_sample(idxes)[1]
+
+    def sample_tensors(self, batch_size):
+        """Same as ``sample``, returned as float32 CPU tensors."""
+        idxes = self._rng.integers(0, self._size, batch_size)
+        return self._encode_sample(idxes)[0]
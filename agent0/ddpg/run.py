@@ -46,6 +46,7 @@ if __name__ == "__main__":
         "time_remain",
         "speed",
         "velocity",
+        "ups",
     ]
 
     reporter = CLIReporter(metric_columns=metric_columns)
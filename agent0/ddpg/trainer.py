@@ -38,6 +38,7 @@ class Trainer(tune.Trainable, ABC):
             [],
         )
         self.best = float("-inf")
+        self.ups = []
         self.sample_ops = None
         super(Trainer, self).__init__(config, logger_creator)
 
@@ -54,24 +55,28 @@ class Trainer(tune.Trainable, ABC):
 
     def step(self):
         tic = time.time()
+        update_steps = self.agent.update_steps
         info = self.agent.step()
-        self.frame_count += 1
+        self.frame_count += self.cfg.num_envs
 
         if "rs" in info:
-            self.Rs.append(info["rs"])
+            self.Rs.extend(info["rs"])
         if "ploss" in info:
             self.PLoss.append(info["ploss"])
         if "vloss" in info:
             self.VLoss.append(info["vloss"])
 
         toc = time.time()
-        self.velocity.append(1.0 / (toc - tic))
+        self.velocity.append(self.cfg.num_envs / (toc - tic))
+        if self.agent.update_steps > update_steps:
+            self.ups.append((self.agent.update_steps - update_steps) / (toc - tic))
 
         result = dict(
             game=self.cfg.game,
             time_past=self._time_total,
-            frames=self._iteration,
+            frames=self.frame_count,
             velocity=np.mean(self.velocity[-20:]) if len(self.velocity) > 0 else 0,
+            ups=np.mean(self.ups[-20:]) if len(self.ups) > 0 else 0,
             speed=self.frame_count / (self._time_total + 1),
             time_remain=(self.cfg.total_steps - self.frame_count)
             / ((self.frame_count + 1) / (self._time_total + 1)),
@@ -89,7 +94,7 @@ class Trainer(tune.Trainable, ABC):
         while True:
             info = self.agent.step(testing=True)
             if "rs" in info:
-                rs.append(info["rs"])
+                rs.extend(info["rs"])
             if len(rs) > self.cfg.test_episodes:
                 break
 
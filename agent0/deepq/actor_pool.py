@@ -0,0 +1,114 @@
+import math
+import time
+from collections import defaultdict
+
+
+class ActorPool:
+    """Tracks actor roles and health for the launchpad trainer.
+
+    One active actor holds the test role and the rest sample. A failed actor is
+    restarted after an exponential backoff. Once it has failed ``max_restarts``
+    times in a row it is retired, and a spare node takes its place if one is
+    left. Roles are rebalanced whenever the test actor goes away.
+    """
+
+    def __init__(self, handles, num_active, max_restarts, backoff, max_backoff):
+        self.handles = dict(enumerate(handles))
+        self.active = list(range(min(num_active, len(self.handles))))
+        self.spares = [rank for rank in self.handles if rank not in self.active]
+        self.max_restarts = max_restarts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.failures = defaultdict(int)
+        self.restarts = {}
+        self.total_failures = 0
+        self.test_rank = None
+        self.rebalance()
+
+    def healthy(self):
+        return [rank for rank in self.active if rank not in self.restarts]
+
+    def samplers(self):
+        return [rank for rank in self.healthy() if rank != self.test_rank]
+
+    def role(self, rank):
+        if rank not in self.active or rank in self.restarts:
+            return None
+        return "test" if rank == self.test_rank else "sample"
+
+    def rebalance(self):
+        if self.test_rank in self.healthy():
+            return
+        healthy = self.healthy()
+        self.test_rank = healthy[0] if len(healthy) > 0 else None
+
+    def add(self, handle=None):
+        if handle is not None:
+            rank = max(self.handles) + 1
+            self.handles[rank] = handle
+        elif len(self.spares) > 0:
+            rank = self.spares.pop(0)
+        else:
+            return None
+        self.active.append(rank)
+        self.failures[rank] = 0
+        self.rebalance()
+        return rank
+
+    def remove(self, rank=None):
+        if rank is None:
+            candidates = [r for r in self.active if r != self.test_rank]
+            if len(candidates) == 0:
+                return None
+            rank = candidates[-1]
+        self.active.remove(rank)
+        self.restarts.pop(rank, None)
+        self.spares.append(rank)
+        self.rebalance()
+        return rank
+
+    def fail(self, rank):
+        self.total_failures += 1
+        if rank not in self.active:
+            return None
+        self.failures[rank] += 1
+        if self.failures[rank] > self.max_restarts:
+            self.active.remove(rank)
+            self.restarts.pop(rank, None)
+            self.add()
+            self.rebalance()
+            return None
+
+        delay = min(self.backoff * 2 ** (self.failures[rank] - 1), self.max_backoff)
+        self.restarts[rank] = time.time() + delay
+        self.rebalance()
+        return delay
+
+    def due_restarts(self):
+        now = time.time()
+        due = [rank for rank, at in self.restarts.items() if at <= now]
+        for rank in due:
+            # In flight: not due again until the restart call fails or returns.
+            self.restarts[rank] = math.inf
+        return due
+
+    def next_restart_in(self):
+        pending = [at for at in self.restarts.values() if at < math.inf]
+        if len(pending) == 0:
+            return None
+        return max(0.0, min(pending) - time.time())
+
+    def restarted(self, rank):
+        self.restarts.pop(rank, None)
+        self.rebalance()
+
+    def succeeded(self, rank):
+        self.failures[rank] = 0
+
+    def stats(self):
+        return dict(
+            actors_active=len(self.healthy()),
+            actors_restarting=len(self.restarts),
+            actor_failures=self.total_failures,
+        )
@@ -9,23 +9,46 @@ from einops import rearrange
 from lz4.block import compress
 
 from agent0.common.atari_wrappers import make_atari
-from agent0.deepq.config import AlgoEnum, ExpConfig
+from agent0.common.timing import timer
+from agent0.common.utils import masked_adam_step
+from agent0.deepq.config import AlgoEnum, DeviceEnum, ExpConfig, env_kwargs
 from agent0.deepq.model import DeepQNet
 
 
 class Actor:
     def __init__(self, cfg: ExpConfig, model=None):
         self.cfg = cfg
-        self.envs = make_atari(cfg.env_id, cfg.actor.num_envs)
-        self.obs, _ = self.envs.reset()
+        self._envs, self.obs = None, None
         self.model = DeepQNet(cfg).to(cfg.device.value) if model is None else model
         self.tracker = deque(maxlen=cfg.learner.n_step_q)
         self.steps = 0
+        # With ensemble heads each env follows one head for a whole episode.
+        self.env_indices = torch.arange(cfg.actor.num_envs).to(cfg.device.value)
+        self.heads = self.sample_heads(cfg.actor.num_envs)
+
+    @property
+    def envs(self):
+        # Created on first use, so actors that only test start without envs.
+        if self._envs is None:
+            self._envs = make_atari(
+                self.cfg.env_id,
+                self.cfg.actor.num_envs,
+                vectorization_mode=self.cfg.actor.vector_mode.value,
+                **env_kwargs(self.cfg),
+            )
+            self.obs, _ = self._envs.reset()
+        return self._envs
+
+    def sample_heads(self, n):
+        heads = torch.randint(0, self.cfg.learner.num_heads, (n,))
+        return heads.to(self.cfg.device.value)
 
     @torch.no_grad()
-    def act(self, epsilon):
+    def act(self, epsilon, test=False):
         st = torch.from_numpy(self.obs).to(self.cfg.device.value).float().div(255.0)
-        qt = self.model.qval(st)
+        qt = self.model.head_qvals(st)
+        # Tests act on the ensemble mean.
+        qt = qt.mean(dim=0) if test else qt[self.heads, self.env_indices]
         action_random = np.random.randint(
             0, self.cfg.action_dim, self.cfg.actor.num_envs
         )
@@ -36,49 +59,70 @@ class Actor:
             action_greedy,
             action_random,
         )
-        return action, qt_max.mean().item()
+        return action, qt_max.mean()
     
     def reset(self):
-        self.obs, _ = self.envs.reset()
+        # A new vector env starts out reset.
+        if self._envs is not None:
+            self.obs, _ = self._envs.reset()
 
     def sample(self, epsilon, state_dict=None, test=False):
         if state_dict is not None:
             self.model.load_state_dict(state_dict)
         rs, qs, data = [], [], []
+        envs = self.envs
         for _ in range(self.cfg.actor.sample_steps):
             if self.cfg.learner.noisy_net and (
                 self.steps % self.cfg.learner.reset_noise_freq == 0
             ):
                 self.model.reset_noise()
 
-            action, qt_max = self.act(epsilon)
-            obs_next, reward, terminal, truncated, info = self.envs.step(action)
+            with timer.phase("inference"):
+                action, qt_max = self.act(epsilon, test)
+            with timer.phase("env_step"):
+                obs_next, reward, terminal, truncated, info = envs.step(action)
             self.steps += 1
-            done = (
-                np.logical_or(terminal, info["life_loss"])
-                if "life_loss" in info
-                else terminal
-            )
-            done = np.logical_and(done, np.logical_not(truncated))
-
-            self.tracker.append((self.obs, action, reward, done))
-            r_nstep = np.zeros_like(reward)
-            d_nstep = np.zeros_like(reward, dtype=np.bool_)
-            for _, _, rt, dt in reversed(self.tracker):
-                d_nstep = np.logical_or(d_nstep, dt)
-                r_nstep = r_nstep * self.cfg.learner.discount * (1 - dt) + rt
-            obs = self.tracker[0][0]
-            action = self.tracker[0][1]
-            reward = r_nstep
-            done = d_nstep
+            if self.cfg.learner.num_heads > 1:
+                ended = np.logical_or(terminal, truncated)
+                if ended.any():
+                    ended = torch.from_numpy(ended).to(self.cfg.device.value)
+                    new_heads = self.sample_heads(len(ended))
+                    self.heads = torch.where(ended, new_heads, self.heads)
+
+            with timer.phase("nstep"):
+                done = (
+                    np.logical_or(terminal, info["life_loss"])
+                    if "life_loss" in info
+                    else terminal
+                )
+                done = np.logical_and(done, np.logical_not(truncated))
+
+                self.tracker.append((self.obs, action, reward, done))
+                r_nstep = np.zeros_like(reward)
+                d_nstep = np.zeros_like(reward, dtype=np.bool_)
+                for _, _, rt, dt in reversed(self.tracker):
+                    d_nstep = np.logical_or(d_nstep, dt)
+                    r_nstep = r_nstep * self.cfg.learner.discount * (1 - dt) + rt
+                obs = self.tracker[0][0]
+                action = self.tracker[0][1]
+                reward = r_nstep
+                done = d_nstep
 
             if test:
                 data.append(self.obs[:4, -1:])
             else:
-                for st, at, rt, dt, st_next in zip(obs, action, reward, done, obs_next):
-                    data.append(
-                        (compress(np.concatenate((st, st_next), axis=0)), at, rt, dt)
-                    )
+                with timer.phase("compress"):
+                    for st, at, rt, dt, st_next in zip(
+                        obs, action, reward, done, obs_next
+                    ):
+                        data.append(
+                            (
+                                compress(np.concatenate((st, st_next), axis=0)),
+                                at,
+                                rt,
+                                dt,
+                            )
+                        )
 
             self.obs = obs_next
             qs.append(qt_max)
@@ -87,10 +131,13 @@ class Actor:
                 for stat in final_infos:
                     rs.append(stat["episode"]["r"][0])
 
+        # Q-value stats stay on device until the whole block has been sampled.
+        qs = torch.stack(qs).tolist() if len(qs) > 0 else []
         return data, rs, qs
 
     def close(self):
-        self.envs.close()
+        if self._envs is not None:
+            self._envs.close()
 
 
 class BaseLearner:
@@ -103,9 +150,16 @@ class BaseLearner:
             self.model.params(),
             cfg.learner.learning_rate,
             eps=1e-2 / cfg.learner.batch_size,
+            # Keeps Adam's step count on device, also in loaded checkpoints.
+            capturable=cfg.device == DeviceEnum.cuda,
         )
         self.update_steps = 0
-        self.batch_indices = torch.arange(cfg.learner.batch_size).to(cfg.device.value)
+        # Non-finite updates not yet taken out of update_steps.
+        self.skipped_steps = torch.zeros((), dtype=torch.long, device=cfg.device.value)
+        # Ensemble heads are stacked head-major along the batch dimension.
+        self.num_heads = cfg.learner.num_heads
+        num_samples = cfg.learner.batch_size * self.num_heads
+        self.batch_indices = torch.arange(num_samples).to(cfg.device.value)
 
     @staticmethod
     def huber_qr_loss(q, q_target, taus):
@@ -121,12 +175,55 @@ class BaseLearner:
     def train_step(self):
         raise NotImplementedError()
 
+    def mask_heads(self, loss, masks):
+        # masks holds each sample's bootstrap mask from the replay, batch x heads.
+        # The per-sample loss, also used for priorities, averages the heads that
+        # train on that sample.
+        loss = loss.view(self.num_heads, -1)
+        masks = masks.t()
+        return loss.mul(masks).sum(dim=0).div(masks.sum(dim=0).clamp(min=1))
+
+    def update(self, q_loss, fraction_loss, weights):
+        # The fraction net only sees detached encoder features and the quantile
+        # loss only sees detached taus, so both losses share a single backward
+        # pass and their gradients land on disjoint parameter groups.
+        objective = q_loss.mul(weights).sum()
+        self.optimizer.zero_grad()
+        if fraction_loss is not None:
+            self.fqf_optimizer.zero_grad()
+            objective = objective + fraction_loss.mul(weights).sum()
+
+        with timer.phase("backward"):
+            objective.backward()
+
+        with timer.phase("optim"):
+            if fraction_loss is not None:
+                if self.cfg.learner.max_grad_norm > 0:
+                    nn.utils.clip_grad_norm_(
+                        self.model.head.fraction_net.parameters(),
+                        self.cfg.learner.max_grad_norm,
+                    )
+                self.fqf_optimizer.step()
+
+            # A non-finite loss skips the update without a host-side check.
+            finite = torch.isfinite(q_loss).all()
+            masked_adam_step(self.optimizer, finite)
+            self.skipped_steps += finite.logical_not()
+        self.update_steps += 1
+        return finite
+
+    def resolve_steps(self):
+        # Takes skipped updates out of update_steps; waits for the device.
+        self.update_steps -= self.skipped_steps.item()
+        self.skipped_steps.zero_()
+        return self.update_steps
+
     def train(self, data):
         if self.cfg.learner.noisy_net:
             self.model.reset_noise()
             self.model_target.reset_noise()
 
-        frames, actions, rewards, terminals, weights, indices = map(
+        frames, actions, rewards, terminals, weights, indices, masks = map(
             lambda x: x.float(), data
         )
         frames = frames.reshape(
@@ -134,38 +231,36 @@ class BaseLearner:
         ).div(255.0)
         obs, next_obs = torch.split(frames, self.cfg.obs_shape[0], 1)
         actions = actions.long()
-        loss = self.train_step(obs, actions, rewards, terminals, next_obs)
+        if self.num_heads > 1:
+            # Observations go through the encoder once; per-sample fields are
+            # repeated so every head gets its own targets.
+            actions, rewards, terminals = (
+                x.repeat(self.num_heads) for x in (actions, rewards, terminals)
+            )
+        with timer.phase("forward"):
+            loss = self.train_step(obs, actions, rewards, terminals, next_obs)
 
         if self.cfg.learner.algo == AlgoEnum.fqf:
             q_loss, fraction_loss = loss
-            self.fqf_optimizer.zero_grad()
-            fraction_loss.mul(weights).sum().backward(retain_graph=True)
-            if self.cfg.learner.max_grad_norm > 0:
-                nn.utils.clip_grad_norm_(
-                    self.model.head.fraction_net.parameters(),
-                    self.cfg.learner.max_grad_norm,
-                )
-            self.fqf_optimizer.step()
         else:
             q_loss, fraction_loss = loss, None
+        if self.num_heads > 1:
+            q_loss = self.mask_heads(q_loss, masks)
 
-        if not torch.isnan(q_loss).any():
-            self.optimizer.zero_grad()
-            q_loss.mul(weights).sum().backward()
-            self.optimizer.step()
-            self.update_steps += 1
-        else:
-            q_loss = None
+        finite = self.update(q_loss, fraction_loss, weights)
 
-        if self.update_steps % self.cfg.learner.target_update_freq == 0:
+        # update_steps only overcounts, so it reaches each multiple no later than
+        # the count of finite updates does. Only then are the skips read back.
+        freq = self.cfg.learner.target_update_freq
+        if self.update_steps % freq == 0 and self.resolve_steps() % freq == 0:
             self.model_target = deepcopy(self.model)
 
+        # Everything stays on device; callers decide when to pay for a copy.
         return {
-            "q_loss": None if q_loss is None else q_loss.detach().cpu(),
-            "fraction_loss": None
-            if fraction_loss is None
-            else fraction_loss.detach().cpu(),
-            "indices": indices.long().detach().cpu(),
+            "q_loss": q_loss.detach(),
+            "fraction_loss": None if fraction_loss is None else fraction_loss.detach(),
+            "nonfinite": finite.logical_not(),
+            "indices": indices.long(),
         }
 
 
@@ -240,20 +335,16 @@ class C51Learner(BaseLearner):
             base = (atoms_next - cfg.vmin) / self.model.head.delta
 
             lo, up = base.floor().long(), base.ceil().long()
-            lo[(up > 0) * (lo == up)] -= 1
-            up[(lo < (cfg.num_atoms - 1)) * (lo == up)] += 1
+            # Masked arithmetic rather than boolean indexing, so it also vmaps.
+            lo = lo - ((up > 0) & (lo == up)).long()
+            up = up + ((lo < (cfg.num_atoms - 1)) & (lo == up)).long()
 
             target_prob = torch.zeros_like(prob_next)
+            batch_size = self.batch_indices.numel()
             offset = torch.linspace(
-                0,
-                ((self.cfg.learner.batch_size - 1) * cfg.num_atoms),
-                self.cfg.learner.batch_size,
+                0, ((batch_size - 1) * cfg.num_atoms), batch_size
             ).to(self.cfg.device.value)
-            offset = (
-                offset.view(-1, 1)
-                .expand(self.cfg.learner.batch_size, cfg.num_atoms)
-                .long()
-            )
+            offset = offset.view(-1, 1).expand(batch_size, cfg.num_atoms).long()
 
             target_prob.view(-1).index_add_(
                 0, (lo + offset).view(-1), (prob_next * (up.float() - base)).view(-1)
@@ -0,0 +1,157 @@
+import queue
+import time
+
+import torch
+import torch.multiprocessing as mp
+
+import agent0.deepq.agent as agents
+from agent0.common.resources import apply_slot
+from agent0.common.utils import set_random_seed
+from agent0.deepq.config import ExpConfig, resource_plan
+from agent0.deepq.model import DeepQNet
+from agent0.deepq.trainer import Trainer, epsilon_schedule
+
+
+def actor_loop(
+    rank, cfg, shared_model, lock, version, frame_count, blocks, stop, slot=None
+):
+    set_random_seed(cfg.seed + rank)
+    if slot is not None:
+        apply_slot(slot)
+    else:
+        torch.set_num_threads(max(cfg.actor.num_threads, 1))
+    actor = agents.Actor(cfg)
+    local_version = -1
+    while not stop.is_set():
+        if version.value != local_version:
+            with lock:
+                local_version = version.value
+                actor.model.load_state_dict(shared_model.state_dict())
+        block = actor.sample(epsilon_schedule(cfg, frame_count.value))
+        # Bounded queue: a full queue stalls the actor until the learner catches up.
+        while not stop.is_set():
+            try:
+                blocks.put((rank, block), timeout=1.0)
+                break
+            except queue.Full:
+                continue
+    actor.close()
+
+
+class AsyncTrainer(Trainer):
+    """Single-node trainer with actors running in background processes.
+
+    Transition blocks flow through a bounded queue while the learner trains, and
+    weights reach the actors through a shared-memory copy of the model that is
+    refreshed every ``trainer.weight_sync_freq`` learner updates.
+    """
+
+    def __init__(self, cfg: ExpConfig):
+        super().__init__(cfg, use_lp=True)
+        # Rank 0 stays in-process for testing, as in the launchpad setup.
+        self.actors = [agents.Actor(cfg, self.learner.model)]
+
+        ctx = mp.get_context("spawn")
+        self.shared_model = DeepQNet(cfg).share_memory()
+        self.shared_model.load_state_dict(self.learner.model.state_dict())
+        self.lock = ctx.Lock()
+        self.version = ctx.Value("i", 0, lock=False)
+        self.shared_frames = ctx.Value("q", self.frame_count, lock=False)
+        self.blocks = ctx.Queue(maxsize=cfg.trainer.queue_size)
+        self.stop = ctx.Event()
+        slots = self.resources or {}
+        self.workers = [
+            ctx.Process(
+                target=actor_loop,
+                args=(
+                    rank,
+                    cfg,
+                    self.shared_model,
+                    self.lock,
+                    self.version,
+                    self.shared_frames,
+                    self.blocks,
+                    self.stop,
+                    slots.get(f"actor-{rank}"),
+                ),
+            )
+            for rank in range(1, max(cfg.num_actors, 2))
+        ]
+        self.synced_steps = self.learner.update_steps
+
+    def next_block(self):
+        # Actors are not daemonic, since their vector envs start subprocesses;
+        # a learner waiting on actors that all died must fail instead of hang.
+        while True:
+            try:
+                return self.blocks.get(timeout=1.0)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in self.workers):
+                    codes = [worker.exitcode for worker in self.workers]
+                    raise RuntimeError(f"All actor processes exited: {codes}")
+
+    def resource_plan(self):
+        # Rank 0 stays in the trainer process; ranks 1.. are actor processes.
+        return resource_plan(self.cfg, max(self.cfg.num_actors, 2) - 1, first_rank=1)
+
+    def sync_weights(self):
+        with self.lock:
+            self.shared_model.load_state_dict(self.learner.model.state_dict())
+            self.version.value += 1
+        self.synced_steps = self.learner.update_steps
+
+    def run(self):
+        for worker in self.workers:
+            worker.start()
+
+        tic, last_frames = time.time(), self.frame_count
+        last_updates = self.learner.update_steps
+        try:
+            for step in self.trainer_steps():
+                if step % self.cfg.trainer.test_freq == 0:
+                    self.test()
+                    tic = time.time()
+                    last_frames = self.frame_count
+                    last_updates = self.learner.update_steps
+
+                _, (transitions, returns, qmax) = self.next_block()
+                self.step(transitions, returns, qmax)
+                self.shared_frames.value = self.frame_count
+
+                updates = self.learner.update_steps - self.synced_steps
+                if updates >= self.cfg.trainer.weight_sync_freq:
+                    self.sync_weights()
+
+                if (step + 1) % self.cfg.trainer.log_freq == 0:
+                    elapsed = time.time() - tic
+                    result = self.summary()
+                    result.update(
+                        fps=(self.frame_count - last_frames) / elapsed,
+                        ups=(self.learner.update_steps - last_updates) / elapsed,
+                    )
+                    self.logging(result)
+                    tic = time.time()
+                    last_frames = self.frame_count
+                    last_updates = self.learner.update_steps
+        finally:
+            self.shutdown()
+
+        self.final()
+
+    def shutdown(self, timeout=30.0):
+        self.stop.set()
+        # Drain so that no actor stays blocked on a full queue.
+        deadline = time.time() + timeout
+        while any(worker.is_alive() for worker in self.workers):
+            if time.time() > deadline:
+                break
+            try:
+                self.blocks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+            for worker in self.workers:
+                worker.join(timeout=0.1)
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
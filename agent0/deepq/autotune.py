@@ -0,0 +1,193 @@
+import argparse
+import copy
+import itertools
+import os
+import socket
+import time
+
+import torch
+import torch.multiprocessing as mp
+
+from agent0.common.env_spec import env_spec
+from agent0.common.utils import set_random_seed
+from agent0.deepq.config import DeviceEnum, ExpConfig, VectorEnum, env_kwargs
+
+# Settings searched by the tuner, written back as Hydra overrides.
+KNOBS = {
+    "num_actors": "num_actors",
+    "num_envs": "actor.num_envs",
+    "sample_steps": "actor.sample_steps",
+    "vector_mode": "actor.vector_mode",
+    "num_threads": "actor.num_threads",
+}
+
+
+def memory_mib(pids):
+    # Proportional set size, so libraries shared by env workers count once.
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1])
+        except FileNotFoundError:
+            continue
+    return total / 1024
+
+
+def make_trial_cfg(base: ExpConfig, trial):
+    cfg = copy.deepcopy(base)
+    cfg.num_actors = trial["num_actors"]
+    cfg.actor.num_envs = trial["num_envs"]
+    cfg.actor.sample_steps = trial["sample_steps"]
+    cfg.actor.vector_mode = VectorEnum[trial["vector_mode"]]
+    cfg.actor.num_threads = trial["num_threads"]
+    return cfg
+
+
+def measure(rank, cfg, seconds, barrier, results):
+    import agent0.deepq.agent as agents
+
+    set_random_seed(cfg.seed + rank)
+    if cfg.actor.num_threads > 0:
+        torch.set_num_threads(cfg.actor.num_threads)
+    actor = agents.Actor(cfg)
+    actor.sample(cfg.actor.min_eps)
+    barrier.wait()
+
+    frames, tic = 0, time.perf_counter()
+    while time.perf_counter() - tic < seconds:
+        actor.sample(cfg.actor.min_eps)
+        frames += cfg.actor.num_envs * cfg.actor.sample_steps
+    fps = frames / (time.perf_counter() - tic)
+    # The actor process plus its vector env workers.
+    pids = [os.getpid()] + [p.pid for p in mp.active_children()]
+    results.put((fps, memory_mib(pids)))
+    actor.close()
+
+
+def run_trial(cfg, seconds):
+    # Actors run side by side, like launch.py, so contention is part of the score.
+    ctx = mp.get_context("spawn")
+    barrier, results = ctx.Barrier(cfg.num_actors), ctx.Queue()
+    procs = [
+        ctx.Process(target=measure, args=(rank, cfg, seconds, barrier, results))
+        for rank in range(cfg.num_actors)
+    ]
+    for p in procs:
+        p.start()
+    try:
+        # Generous timeout so a crashed actor fails the trial instead of hanging.
+        stats = [results.get(timeout=seconds + 600) for _ in procs]
+    finally:
+        for p in procs:
+            p.join(timeout=60)
+            if p.is_alive():
+                p.terminate()
+    return sum(fps for fps, _ in stats), sum(mem for _, mem in stats)
+
+
+def evaluate(base, trials, seconds, max_memory):
+    scores = []
+    for trial in trials:
+        try:
+            fps, memory = run_trial(make_trial_cfg(base, trial), seconds)
+        except Exception as e:
+            print(f"  failed {trial}: {e}")
+            continue
+        ok = max_memory <= 0 or memory <= max_memory
+        status = "" if ok else "  (over memory budget)"
+        print(f"  {trial} -> {fps:9.1f} fps | {memory:8.1f} MiB{status}", flush=True)
+        if ok:
+            scores.append((fps, memory, trial))
+    return sorted(scores, key=lambda x: x[0], reverse=True)
+
+
+def successive_halving(base, trials, seconds, eta, max_memory):
+    rung = 0
+    while True:
+        print(f"Rung {rung}: {len(trials)} configs, {seconds:.1f}s each")
+        scores = evaluate(base, trials, seconds, max_memory)
+        if len(scores) <= 1:
+            return scores
+        trials = [trial for _, _, trial in scores[: max(len(scores) // eta, 1)]]
+        seconds *= eta
+        rung += 1
+
+
+def write_overrides(path, env_id, fps, memory, trial):
+    # '@package _global_' merges the file into the root config when it is
+    # selected with: --config-dir <dir> +autotune=<name>
+    lines = [
+        "# @package _global_",
+        f"# autotune for {env_id} on {socket.gethostname()}: "
+        f"{fps:.1f} fps, {memory:.1f} MiB",
+        f"num_actors: {trial['num_actors']}",
+        "actor:",
+    ]
+    for key in ("num_envs", "sample_steps", "vector_mode", "num_threads"):
+        lines.append(f"  {key}: {trial[key]}")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def int_list(text):
+    return [int(x) for x in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune actor settings for this host")
+    parser.add_argument("--env_id", default="Breakout")
+    parser.add_argument("--device", default="cpu", choices=["cpu", "cuda"])
+    parser.add_argument("--num_actors", type=int_list, default=[1, 2, 4])
+    parser.add_argument("--num_envs", type=int_list, default=[8, 16, 32])
+    parser.add_argument("--sample_steps", type=int_list, default=[40, 80])
+    parser.add_argument(
+        "--vector_mode", default="subproc", help="comma list of sync,subproc"
+    )
+    parser.add_argument("--num_threads", type=int_list, default=[1, 2])
+    parser.add_argument("--search", default="halving", choices=["grid", "halving"])
+    parser.add_argument("--seconds", type=float, default=5.0, help="first rung budget")
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--max_memory", type=float, default=0, help="MiB, 0 = any")
+    parser.add_argument("--output", default="autotune/autotune/host.yaml")
+    args = parser.parse_args()
+
+    base = ExpConfig(env_id=args.env_id, device=DeviceEnum(args.device))
+    base.obs_shape, base.action_dim = env_spec(base.env_id, **env_kwargs(base))
+
+    grid = dict(
+        num_actors=args.num_actors,
+        num_envs=args.num_envs,
+        sample_steps=args.sample_steps,
+        vector_mode=args.vector_mode.split(","),
+        num_threads=args.num_threads,
+    )
+    trials = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    print(f"Tuning {len(trials)} configs for {args.env_id} on {os.cpu_count()} cpus")
+
+    if args.search == "grid":
+        scores = evaluate(base, trials, args.seconds, args.max_memory)
+    else:
+        scores = successive_halving(
+            base, trials, args.seconds, args.eta, args.max_memory
+        )
+    if len(scores) == 0:
+        raise RuntimeError("No configuration finished within the memory budget")
+
+    fps, memory, best = scores[0]
+    write_overrides(args.output, args.env_id, fps, memory, best)
+    overrides = " ".join(f"{KNOBS[k]}={v}" for k, v in best.items())
+    config_dir = os.path.dirname(os.path.dirname(os.path.abspath(args.output)))
+    name = os.path.splitext(os.path.basename(args.output))[0]
+    print(f"Best: {fps:.1f} fps, {memory:.1f} MiB -> {overrides}")
+    print(f"Wrote {args.output}; use it with:")
+    print(f"  python -m agent0.deepq.main --config-dir {config_dir} +autotune={name}")
+    print(f"  python -m agent0.deepq.launch --config-dir {config_dir} +autotune={name}")
+
+
+if __name__ == "__main__":
+    mp.set_start_method("spawn", force=True)
+    main()
@@ -1,7 +1,9 @@
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 from enum import Enum
 from typing import Any
 
+from agent0.common.resources import parse_cpus, plan_resources
+
 
 class AlgoEnum(Enum):
     dqn = 0
@@ -23,10 +25,21 @@ class ReplayEnum(Enum):
     prioritize = 1
 
 
+class TransportEnum(Enum):
+    courier = 0
+    shm = 1
+
+
+class VectorEnum(Enum):
+    sync = "sync"
+    subproc = "async"
+
+
 class ModeEnum(Enum):
     train = 0
     finetune = 1
     play = 2
+    offline = 3
 
 
 class EnvEnum(Enum):
@@ -81,14 +94,24 @@ class LearnerConfig:
 
     target_update_freq: int = 500
     learner_steps: int = 20
+    # Replay ratio control for launch.py; 0 keeps learner_steps per block.
+    samples_per_insert: float = 0.0
+    spi_error_buffer: float = 0.0
 
     double_q: bool = False
     dueling_head: bool = False
     n_step_q: int = 1
 
     noisy_net: bool = False
+    # Smaller buffers and reset_noise, slower forward/backward on large batches.
+    noisy_factorized: bool = False
     reset_noise_freq: int = 4
 
+    # Bootstrapped ensemble: heads sharing one encoder (dqn, mdqn, c51, qr, iqn).
+    num_heads: int = 1
+    # Probability that a head trains on a transition, drawn once per transition.
+    head_mask_prob: float = 1.0
+
     c51: C51Config = field(default_factory=C51Config)
     qr: QRConfig = field(default=QRConfig)
     iqn: IQNConfig = field(default=IQNConfig)
@@ -103,6 +126,24 @@ class TrainerConfig:
     log_freq: int = 10
     test_freq: int = 500
     test_episodes: int = 20
+    async_actors: bool = False
+    queue_size: int = 8
+    weight_sync_freq: int = 100
+    metrics_flush_secs: float = 2.0
+    phase_timing: bool = False
+    phase_timing_sync: bool = False
+    trace: bool = False
+    data_workers: int = 2
+    prefetch_depth: int = 2
+    # Frames between checkpoints in <logdir>/checkpoints; 0 disables them.
+    checkpoint_freq: int = 0
+    checkpoint_keep: int = 3
+    # Checkpoint to resume from: a ckpt-* directory or a checkpoints directory.
+    resume: str = ""
+    # Write the replay to <logdir>/replay at the end, for offline mode.
+    save_replay: bool = False
+    # Independent seeds trained in one process with a vmapped learner.
+    num_seeds: int = 1
 
 
 @dataclass
@@ -113,6 +154,17 @@ class ActorConfig:
     test_steps: int = 800
     min_eps: float = 0.01
     test_eps: float = 0.001
+    vector_mode: VectorEnum = VectorEnum.subproc
+    # Torch threads per actor process; 0 keeps the default.
+    num_threads: int = 0
+    transport: TransportEnum = TransportEnum.courier
+    ring_slots: int = 2
+    # Seconds a ring read or write waits for its slot before failing the call.
+    ring_timeout: float = 60.0
+    spare_actors: int = 0
+    max_restarts: int = 5
+    restart_backoff: float = 1.0
+    max_restart_backoff: float = 60.0
 
 
 @dataclass
@@ -124,6 +176,35 @@ class ReplayConfig:
     eps: float = 0.01
 
 
+@dataclass
+class ResourceConfig:
+    # Pin processes to cores and size their thread pools, see common/resources.py.
+    enabled: bool = False
+    cpus: str = ""
+    trainer_cpus: int = 0
+    learner_threads: int = 0
+
+
+@dataclass
+class SyntheticConfig:
+    # Used when env_id=Synthetic, see SyntheticAtariEnv.
+    action_dim: int = 6
+    episode_length: int = 1000
+    life_loss_freq: int = 200
+    step_cost: float = 0.0
+    frame_entropy: float = 0.05
+    reward_prob: float = 0.05
+
+
+@dataclass
+class OfflineConfig:
+    # Learner-only runs from a replay snapshot, see deepq/offline.py.
+    replay: str = ""
+    updates: int = int(1e5)
+    # Updates between greedy evaluations in a side process; 0 disables them.
+    eval_freq: int = 0
+
+
 @dataclass
 class ExpConfig:
     env_id: str = "Breakout"
@@ -135,6 +216,8 @@ class ExpConfig:
     device: DeviceEnum = DeviceEnum.cuda
     name: str = "agent0"
     mode: ModeEnum = ModeEnum.train
+    # Weights for play and finetune modes: a checkpoint directory or .pth file.
+    checkpoint: str = ""
     logdir: str = "logs"
     wandb: bool = True
     tb: bool = True
@@ -143,3 +226,26 @@ class ExpConfig:
     trainer: TrainerConfig = field(default_factory=TrainerConfig)
     actor: ActorConfig = field(default_factory=ActorConfig)
     replay: ReplayConfig = field(default_factory=ReplayConfig)
+    synthetic: SyntheticConfig = field(default_factory=SyntheticConfig)
+    resources: ResourceConfig = field(default_factory=ResourceConfig)
+    offline: OfflineConfig = field(default_factory=OfflineConfig)
+
+
+def env_kwargs(cfg: ExpConfig):
+    # Extra make_atari arguments; only the synthetic backend takes any.
+    return asdict(cfg.synthetic) if cfg.env_id == "Synthetic" else {}
+
+
+def resource_plan(cfg: ExpConfig, num_actors, first_rank=0):
+    # Subprocess vector envs add one worker process per env to each actor.
+    subproc = cfg.actor.vector_mode == VectorEnum.subproc
+    return plan_resources(
+        parse_cpus(cfg.resources.cpus),
+        num_actors,
+        cfg.actor.num_envs if subproc else 0,
+        cfg.trainer.data_workers,
+        cfg.resources.trainer_cpus,
+        cfg.resources.learner_threads,
+        max(cfg.actor.num_threads, 1),
+        first_rank,
+    )
@@ -1,14 +1,16 @@
 # from tensorboardX import SummaryWriter
+import hashlib
 import os
 import time
+from collections import deque
 from concurrent import futures
 from time import localtime, strftime
 
-import git
 import hydra
 import launchpad as lp
 import numpy as np
 import shortuuid
+import torch
 from absl import logging
 from dacite import from_dict
 from einops import repeat
@@ -16,106 +18,283 @@ from hydra.core.config_store import ConfigStore
 from omegaconf import OmegaConf
 
 import agent0.deepq.agent as agents
-import wandb
-from agent0.common.atari_wrappers import make_atari
-from agent0.deepq.config import ExpConfig
+from agent0.common.env_spec import env_spec
+from agent0.common.rate_limiter import RateLimiter
+from agent0.common.resources import apply_slot, format_cpus, parse_cpus
+from agent0.common.timing import timer
+from agent0.common.tracing import tracer
+from agent0.common.transport import TransitionRing, lz4_bound
+from agent0.deepq.actor_pool import ActorPool
+from agent0.deepq.config import ExpConfig, TransportEnum, env_kwargs, resource_plan
 from agent0.deepq.trainer import Trainer
 
 
+def make_ring(cfg: ExpConfig, rank, create=False):
+    # Names only need to be unique per run; logdir carries a per-run uuid.
+    digest = hashlib.sha1(cfg.logdir.encode()).hexdigest()[:12]
+    max_items = cfg.actor.sample_steps * cfg.actor.num_envs
+    frame_bytes = 2 * int(np.prod(cfg.obs_shape))
+    return TransitionRing(
+        f"agent0-{digest}-{rank}",
+        cfg.actor.ring_slots,
+        max_items,
+        max_items * lz4_bound(frame_bytes),
+        create=create,
+    )
+
+
+def launch_plan(cfg: ExpConfig):
+    return resource_plan(cfg, cfg.num_actors + cfg.actor.spare_actors)
+
+
 class TrainerNode(Trainer):
     def __init__(self, cfg: ExpConfig, actors):
         super().__init__(cfg, use_lp=True)
         self.actors = actors
+        self.pool = ActorPool(
+            actors,
+            cfg.num_actors,
+            cfg.actor.max_restarts,
+            cfg.actor.restart_backoff,
+            cfg.actor.max_restart_backoff,
+        )
+        self.target_actors = None
+        # In-flight actor calls: future -> (rank, kind, flow id).
+        self.tasks = {}
+        self.rings = {}
 
-    def run(self):
-        trainer_steps = self.cfg.trainer.total_steps // self.num_transitions + 1
-        sample_eps = self.epsilon_fn(self.frame_count)
-        tasks = [
-            actor.futures.sample(sample_eps, self.learner.model.state_dict())
-            for actor in self.actors[1:]
-        ]
-
-        tasks.append(
-            self.actors[0].futures.test(
-                self.frame_count, self.learner.model.state_dict()
+        spi = cfg.learner.samples_per_insert
+        if spi > 0:
+            error_buffer = cfg.learner.spi_error_buffer
+            if error_buffer <= 0:
+                error_buffer = self.num_transitions * spi + cfg.learner.batch_size
+            self.limiter = RateLimiter(
+                spi, cfg.trainer.training_start_steps, error_buffer
             )
-        )
+            self.limiter.check_block_sizes(
+                self.num_transitions, cfg.learner.batch_size
+            )
+        else:
+            self.limiter = None
+
+        self.flow_id = 0
+        if cfg.trainer.trace:
+            path = os.path.join(cfg.logdir, "traces", "trainer.json")
+            tracer.configure(path, "trainer")
+
+    def resource_plan(self):
+        return launch_plan(self.cfg)
 
-        step = 0
-        while step < trainer_steps:
-            tic = time.time()
-            dones, not_dones = futures.wait(tasks, return_when=futures.FIRST_COMPLETED)
-            tasks = list(dones) + list(not_dones)
-            rank, (transitions_or_video, returns, qmax_or_frames) = tasks.pop(
-                0
-            ).result()
-            if rank > 0:
-                qmax = qmax_or_frames
-                transitions = transitions_or_video
-                sample_eps = self.epsilon_fn(self.frame_count)
-                tasks.append(
-                    self.actors[rank].futures.sample(
-                        sample_eps, self.learner.model.state_dict()
+    def resize(self, num_actors):
+        # Courier entry point; applied by the run loop.
+        self.target_actors = num_actors
+        return len(self.pool.active)
+
+    def apply_resize(self):
+        if self.target_actors is None:
+            return
+        while len(self.pool.active) < self.target_actors:
+            rank = self.pool.add()
+            if rank is None:
+                break
+            self.logger.info(f"Actor pool: added actor {rank}")
+        while len(self.pool.active) > max(self.target_actors, 1):
+            rank = self.pool.remove()
+            if rank is None:
+                break
+            self.logger.info(f"Actor pool: removed actor {rank}")
+        self.target_actors = None
+
+    def receive(self, rank, transitions):
+        if self.cfg.actor.transport != TransportEnum.shm:
+            return transitions
+        if rank not in self.rings:
+            self.rings[rank] = make_ring(self.cfg, rank)
+        # With shm, the result carries the sequence number of the ring block.
+        with tracer.span("ring_read", rank=rank):
+            return self.rings[rank].read(transitions, self.cfg.actor.ring_timeout)
+
+    def dispatch(self, busy):
+        # Give every healthy actor without an outstanding call its current role.
+        for rank in self.pool.healthy():
+            if rank in busy:
+                continue
+            role = self.pool.role(rank)
+            handle = self.pool.handles[rank]
+            self.flow_id += 1
+            # Covers weight serialization, which courier does before sending.
+            with tracer.span("dispatch", rank=rank, role=role):
+                tracer.flow(role, self.flow_id, start=True)
+                state_dict = self.learner.model.state_dict()
+                if role == "test":
+                    future = handle.futures.test(
+                        self.frame_count, state_dict, trace_id=self.flow_id
                     )
-                )
-                result = self.step(transitions, returns, qmax)
-                step += 1
-            else:
-                tasks.append(
-                    self.actors[rank].futures.test(
-                        self.frame_count, self.learner.model.state_dict()
+                else:
+                    sample_eps = self.epsilon_fn(self.frame_count)
+                    future = handle.futures.sample(
+                        sample_eps, state_dict, trace_id=self.flow_id
                     )
-                )
+            self.tasks[future] = (rank, role, self.flow_id)
 
-                test_frames = qmax_or_frames
-                video = transitions_or_video
-                video = np.stack(video, axis=1)
-                video = repeat(video, "n t c h w -> n t (3 c) h w")
-                self.RTs.extend(returns)
+        for rank in self.pool.due_restarts():
+            self.logger.info(f"Actor pool: restarting actor {rank}")
+            future = self.pool.handles[rank].futures.restart()
+            self.tasks[future] = (rank, "restart", None)
 
-                if self.cfg.tb:
-                    self.writer.add_scalar("return_test", np.mean(returns), test_frames)
-                    self.writer.add_scalar(
-                        "return_test_max", np.max(self.RTs), test_frames
-                    )
-                    self.writer.add_video("test_video", video, test_frames, fps=60)
-                if self.cfg.wandb:
-                    wandb.log({"return_test": np.mean(returns), "frame": test_frames})
-                    wandb.log(
-                        {"return_test_max": np.max(self.RTs), "frame": test_frames}
+    def record_test(self, video, returns, test_frames):
+        tracer.instant("test_result", frames=test_frames)
+        video = np.stack(video, axis=1)
+        video = repeat(video, "n t c h w -> n t (3 c) h w")
+        self.RTs.extend(returns)
+        self.save_best(returns, test_frames)
+
+        self.sink.scalar("return_test", np.mean(returns), test_frames)
+        self.sink.scalar("return_test_max", self.RTs.best(), test_frames)
+        self.sink.video("test_video", video, test_frames, fps=60)
+
+    def run(self):
+        trainer_steps = self.trainer_steps()
+        batch_size = self.cfg.learner.batch_size
+        # Sampled blocks waiting for the rate limiter; their actors stay idle.
+        held = deque()
+
+        step = logged_step = trainer_steps.start
+        tic, last_frames = time.time(), self.frame_count
+        while step < trainer_steps.stop:
+            self.apply_resize()
+
+            progressed = False
+            if self.limiter is not None:
+                for _ in range(self.cfg.learner.learner_steps):
+                    if not self.limiter.can_sample(batch_size):
+                        break
+                    with tracer.span("update"):
+                        self.update()
+                    self.limiter.sample(batch_size)
+                    progressed = True
+
+                while len(held) > 0 and self.limiter.can_insert(self.num_transitions):
+                    _, (transitions, returns, qmax), since = held.popleft()
+                    self.limiter.insert_stall += time.time() - since
+                    with tracer.span("ingest"):
+                        self.ingest(transitions, returns, qmax)
+                    self.limiter.insert(self.num_transitions)
+                    step += 1
+                    progressed = True
+
+            busy = {rank for rank, _, _ in self.tasks.values()}
+            self.dispatch(busy | {rank for rank, _, _ in held})
+
+            # Only block on actors when the learner has nothing left to do, and
+            # wake up in time for the next scheduled restart.
+            timeout = 0 if progressed else self.pool.next_restart_in()
+            if len(self.tasks) == 0 and timeout is None:
+                raise RuntimeError("Actor pool has no actors left")
+            wait_tic = time.time()
+            with tracer.span("wait", inflight=len(self.tasks)):
+                dones, _ = futures.wait(
+                    list(self.tasks),
+                    timeout=timeout,
+                    return_when=futures.FIRST_COMPLETED,
+                )
+            if self.limiter is not None and not progressed:
+                self.limiter.sample_stall += time.time() - wait_tic
+
+            for done in dones:
+                rank, kind, flow_id = self.tasks.pop(done)
+                try:
+                    with tracer.span("result", rank=rank, kind=kind):
+                        if flow_id is not None:
+                            tracer.flow(kind, f"{flow_id}r", start=False)
+                        result = done.result()
+                except Exception:
+                    delay = self.pool.fail(rank)
+                    self.logger.exception(
+                        f"Actor {rank} failed during {kind}; "
+                        + ("retired" if delay is None else f"retry in {delay:.1f}s")
                     )
-                    wandb.log({"test_video": wandb.Video(video, fps=60, format="mp4"), "frame": test_frames})
+                    continue
 
-                continue
+                if kind == "restart":
+                    self.pool.restarted(rank)
+                    continue
 
-            if rank > 0 and self.frame_count > self.cfg.trainer.training_start_steps:
-                fps = self.num_transitions / (time.time() - tic)
-                result.update(fps=fps)
-            self.logging(result)
+                _, (transitions_or_video, returns, qmax_or_frames) = result
+                if kind == "test":
+                    self.pool.succeeded(rank)
+                    self.record_test(transitions_or_video, returns, qmax_or_frames)
+                    continue
+
+                try:
+                    transitions = self.receive(rank, transitions_or_video)
+                except (TimeoutError, LookupError):
+                    # The restart resets the actor's ring.
+                    delay = self.pool.fail(rank)
+                    self.logger.exception(
+                        f"Actor {rank} ring read failed; "
+                        + ("retired" if delay is None else f"retry in {delay:.1f}s")
+                    )
+                    continue
+                self.pool.succeeded(rank)
+                if self.limiter is None:
+                    with tracer.span("step", rank=rank):
+                        self.step(transitions, returns, qmax_or_frames)
+                    step += 1
+                else:
+                    block = (transitions, returns, qmax_or_frames)
+                    held.append((rank, block, time.time()))
+                    tracer.counter("held_blocks", held=len(held))
+
+            if step - logged_step >= self.cfg.trainer.log_freq:
+                result = self.summary()
+                if self.frame_count > self.cfg.trainer.training_start_steps:
+                    fps = (self.frame_count - last_frames) / (time.time() - tic)
+                    result.update(fps=fps)
+                if self.limiter is not None:
+                    result.update(self.limiter.stats())
+                    result.update(held_blocks=len(held), inflight=len(self.tasks))
+                result.update(self.pool.stats())
+                self.logging(result)
+                tic, last_frames = time.time(), self.frame_count
+                logged_step = step
 
         self.final()
 
     def final(self):
         self.logger.info("Final Testing ... ")
-        dones = futures.wait(
+        futures.wait(list(self.tasks), return_when=futures.ALL_COMPLETED)
+        dones, _ = futures.wait(
             [
-                actor.futures.test(self.frame_count, self.learner.model.state_dict())
-                for actor in self.actors
+                self.pool.handles[rank].futures.test(
+                    self.frame_count, self.learner.model.state_dict()
+                )
+                for rank in self.pool.healthy()
             ],
             return_when=futures.ALL_COMPLETED,
         )
         test_returns = []
         for done in dones:
+            if done.exception() is not None:
+                continue
             _, (_, returns, _) = done.result()
             test_returns.extend(returns)
+        self.RTs.extend(test_returns)
 
-        self.logger.info(
+        self.sink.info(
             f"TEST ---> Frames: {self.frame_count} | Return Avg: {np.mean(test_returns):.2f} Max: {np.max(test_returns)}"
         )
-        self.writer.add_scalar("return_test", np.mean(test_returns), self.frame_count)
-        self.writer.add_scalar("return_test_max", np.max(self.RTs), self.frame_count)
+        self.sink.scalar("return_test", np.mean(test_returns), self.frame_count)
+        self.sink.scalar("return_test_max", self.RTs.best(), self.frame_count)
+        self.close_checkpointer()
+        self.snapshot_replay()
+        self.sink.close()
+        tracer.close()
+        for ring in self.rings.values():
+            ring.close()
         futures.wait(
-            [actor.close() for actor in self.actors], return_when=futures.ALL_COMPLETED
+            [handle.futures.close() for handle in self.pool.handles.values()],
+            return_when=futures.ALL_COMPLETED,
         )
 
 
@@ -124,20 +303,60 @@ class ActorNode:
         self.cfg = cfg
         self.rank = rank
         self.step_count = 0
+        if cfg.resources.enabled:
+            slot = launch_plan(cfg)[f"actor-{rank}"]
+            apply_slot(slot)
+            logging.info(f"Rank {rank} -- {slot}")
+        elif cfg.actor.num_threads > 0:
+            torch.set_num_threads(cfg.actor.num_threads)
         self.actor = agents.Actor(cfg)
+        timer.configure(cfg.trainer.phase_timing, cfg.trainer.phase_timing_sync)
+        if cfg.trainer.trace:
+            path = os.path.join(cfg.logdir, "traces", f"actor-{rank}.json")
+            tracer.configure(path, f"actor-{rank}")
+        if cfg.actor.transport == TransportEnum.shm:
+            self.ring = make_ring(cfg, rank, create=True)
+        else:
+            self.ring = None
+
+    def sample(self, epsilon, model_dict=None, trace_id=None):
+        with tracer.span("sample", step=self.step_count):
+            if trace_id is not None:
+                tracer.flow("sample", trace_id, start=False)
+            return self._sample(epsilon, model_dict, trace_id)
 
-    def sample(self, epsilon, model_dict=None):
+    def _sample(self, epsilon, model_dict, trace_id):
         tic = time.time()
         transition, returns, qmax = self.actor.sample(epsilon, model_dict)
         toc = time.time()
         fps = len(transition) / (toc - tic)
         self.step_count += 1
-        logging.info(
-            f"Rank {self.rank} -- Step: {self.step_count:7d} | FPS: {fps:.2f} | Avg Return: {np.mean(returns):.2f}"
-        )
+        if self.ring is not None:
+            # Transitions travel through shared memory; the future only carries stats.
+            with timer.phase("ring_write"):
+                self.ring.write(
+                    transition, self.step_count, self.cfg.actor.ring_timeout
+                )
+            transition = self.step_count
+        msg = f"Rank {self.rank} -- Step: {self.step_count:7d} | FPS: {fps:.2f} | Avg Return: {np.mean(returns):.2f}"
+        phases = timer.flush()
+        if phases:
+            msg += " | " + " ".join(f"{k}: {v:.3f}s" for k, v in phases.items())
+        logging.info(msg)
+        if trace_id is not None:
+            tracer.flow("sample", f"{trace_id}r", start=True)
         return self.rank, (transition, returns, qmax)
 
-    def test(self, frame_count, model_dict=None):
+    def test(self, frame_count, model_dict=None, trace_id=None):
+        with tracer.span("test", frames=frame_count):
+            if trace_id is not None:
+                tracer.flow("test", trace_id, start=False)
+            result = self._test(frame_count, model_dict)
+            if trace_id is not None:
+                tracer.flow("test", f"{trace_id}r", start=True)
+        return result
+
+    def _test(self, frame_count, model_dict):
         rs = []
         tic = time.time()
         frames = 0
@@ -158,8 +377,23 @@ class ActorNode:
         )
         return self.rank, (video, rs, frame_count)
 
+    def restart(self):
+        tracer.instant("restart")
+        try:
+            self.actor.close()
+        except Exception:
+            logging.exception(f"Rank {self.rank} -- failed to close actor")
+        self.actor = agents.Actor(self.cfg)
+        # Blocks of failed calls would otherwise pair with later results.
+        if self.ring is not None:
+            self.ring.reset()
+        return self.rank
+
     def close(self):
         self.actor.close()
+        tracer.close()
+        if self.ring is not None:
+            self.ring.close()
 
 
 def make_program(cfg: ExpConfig):
@@ -167,7 +401,7 @@ def make_program(cfg: ExpConfig):
     with program.group("actors"):
         actors = [
             program.add_node(lp.CourierNode(ActorNode, rank, cfg))
-            for rank in range(cfg.num_actors)
+            for rank in range(cfg.num_actors + cfg.actor.spare_actors)
         ]
 
     node = lp.CourierNode(TrainerNode, cfg=cfg, actors=actors)
@@ -177,6 +411,8 @@ def make_program(cfg: ExpConfig):
 
 @hydra.main(version_base=None, config_name="config")
 def main(cfg: ExpConfig):
+    import git
+
     repo = git.Repo(search_parent_directories=True)
     sha = repo.head.object.hexsha[:8]
     uuid = shortuuid.uuid()[:4]
@@ -184,16 +420,16 @@ def main(cfg: ExpConfig):
     subdir = (
         f"{cfg.name}-{cfg.env_id}-{cfg.learner.algo.name}-{cfg.seed}-{sha}-{timestr}-{uuid}"
     )
-    dummy_env = make_atari(cfg.env_id, num_envs=1)
-    dummy_env.close()
-
-    cfg.logdir = os.path.join(cfg.logdir, subdir)
-    cfg.obs_shape = dummy_env.observation_space.shape[1:]
-    cfg.action_dim = int(dummy_env.action_space[0].n)
-
     cfg = OmegaConf.to_container(cfg)
     cfg = from_dict(ExpConfig, cfg)
 
+    if cfg.resources.enabled and cfg.resources.cpus == "":
+        # Fix the core set now; the trainer pins itself before actors read it.
+        cfg.resources.cpus = format_cpus(parse_cpus(""))
+
+    cfg.logdir = os.path.join(cfg.logdir, subdir)
+    cfg.obs_shape, cfg.action_dim = env_spec(cfg.env_id, **env_kwargs(cfg))
+
     program = make_program(cfg)
     lp.launch(program, launch_type="local_mp", terminal="tmux_session")
 
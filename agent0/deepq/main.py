@@ -1,20 +1,20 @@
 import os
 from time import localtime, strftime
 
-import git
 import hydra
 import shortuuid
 from dacite import from_dict
 from hydra.core.config_store import ConfigStore
 
-from agent0.common.atari_wrappers import make_atari
+from agent0.common.env_spec import env_spec
 from agent0.common.utils import set_random_seed
-from agent0.deepq.config import ExpConfig
-from agent0.deepq.trainer import Trainer
+from agent0.deepq.config import ExpConfig, ModeEnum, env_kwargs
 
 
 @hydra.main(version_base=None, config_name="config")
 def main(cfg: ExpConfig):
+    import git
+
     repo = git.Repo(search_parent_directories=True)
     sha = repo.head.object.hexsha[:8]
     uuid = shortuuid.uuid()[:4]
@@ -22,17 +22,33 @@ def main(cfg: ExpConfig):
     subdir = (
         f"{cfg.name}-{cfg.env_id}-{cfg.learner.algo.name}-{cfg.seed}-{sha}-{timestr}-{uuid}"
     )
-    dummy_env = make_atari(cfg.env_id, num_envs=1)
-    dummy_env.close()
-
     cfg = from_dict(ExpConfig, cfg)
 
     cfg.logdir = os.path.join(cfg.logdir, subdir)
-    cfg.obs_shape = dummy_env.observation_space.shape[1:]
-    cfg.action_dim = int(dummy_env.action_space[0].n)
+    cfg.obs_shape, cfg.action_dim = env_spec(cfg.env_id, **env_kwargs(cfg))
 
     set_random_seed(cfg.seed)
-    Trainer(cfg).run()
+    # Trainers are imported on demand: play mode skips wandb and tensorboard.
+    if cfg.mode == ModeEnum.play:
+        from agent0.deepq.play import play
+
+        play(cfg)
+    elif cfg.mode == ModeEnum.offline:
+        from agent0.deepq.offline import OfflineTrainer
+
+        OfflineTrainer(cfg).run()
+    elif cfg.trainer.num_seeds > 1:
+        from agent0.deepq.multi_seed import MultiSeedTrainer
+
+        MultiSeedTrainer(cfg).run()
+    elif cfg.trainer.async_actors:
+        from agent0.deepq.async_trainer import AsyncTrainer
+
+        AsyncTrainer(cfg).run()
+    else:
+        from agent0.deepq.trainer import Trainer
+
+        Trainer(cfg).run()
 
 
 if __name__ == "__main__":
@@ -1,3 +1,4 @@
+from functools import partial
 from itertools import chain
 from typing import Iterator
 
@@ -16,6 +17,10 @@ def init(m, gain=1.0):
     if isinstance(m, nn.Conv2d) or isinstance(m, nn.Linear):
         nn.init.orthogonal_(m.weight.data, gain)
         nn.init.zeros_(m.bias.data)
+    elif isinstance(m, EnsembleLinear):
+        for weight in m.weight.data:
+            nn.init.orthogonal_(weight, gain)
+        nn.init.zeros_(m.bias.data)
 
 
 def init_xavier(m, gain=1.0):
@@ -26,20 +31,34 @@ def init_xavier(m, gain=1.0):
 
 
 class NoisyLinear(nn.Module):
-    def __init__(self, in_features, out_features, std_init=0.4, noisy_layer_std=0.1):
+    def __init__(
+        self,
+        in_features,
+        out_features,
+        std_init=0.4,
+        noisy_layer_std=0.1,
+        factorized=False,
+    ):
         super(NoisyLinear, self).__init__()
 
         self.in_features = in_features
         self.out_features = out_features
         self.std_init = std_init
         self.noisy_layer_std = noisy_layer_std
+        # Factorized mode keeps only the input/output noise vectors and never
+        # materializes the (out x in) weight noise matrix. It costs a second
+        # matmul per forward and backward, which is slower on learner batches.
+        self.factorized = factorized
         self.weight_mu = nn.Parameter(
             torch.zeros((out_features, in_features)), requires_grad=True
         )
         self.weight_sigma = nn.Parameter(
             torch.zeros((out_features, in_features)), requires_grad=True
         )
-        self.register_buffer("weight_epsilon", torch.zeros((out_features, in_features)))
+        if not factorized:
+            self.register_buffer(
+                "weight_epsilon", torch.zeros((out_features, in_features))
+            )
         self.bias_mu = nn.Parameter(torch.zeros(out_features), requires_grad=True)
         self.bias_sigma = nn.Parameter(torch.zeros(out_features), requires_grad=True)
         self.register_buffer("bias_epsilon", torch.zeros(out_features))
@@ -52,7 +71,13 @@ class NoisyLinear(nn.Module):
         self.reset_noise()
 
     def forward(self, x):
-        if self.training:
+        if self.training and self.factorized:
+            # x @ (mu + sigma * f_out f_in^T) == x @ mu + ((x * f_in) @ sigma) * f_out
+            bias = self.bias_mu + self.bias_sigma.mul(self.bias_epsilon)
+            out = nn.functional.linear(x, self.weight_mu, bias)
+            noise = nn.functional.linear(x.mul(self.noise_in), self.weight_sigma)
+            return out + noise.mul(self.noise_out_weight)
+        elif self.training:
             weight = self.weight_mu + self.weight_sigma.mul(self.weight_epsilon)
             bias = self.bias_mu + self.bias_sigma.mul(self.bias_epsilon)
         else:
@@ -75,11 +100,15 @@ class NoisyLinear(nn.Module):
         self.noise_out_weight.normal_(std=self.noisy_layer_std)
         self.noise_out_bias.normal_(std=self.noisy_layer_std)
 
-        self.weight_epsilon.copy_(
-            self.transform_noise(self.noise_out_weight).ger(
-                self.transform_noise(self.noise_in)
+        if self.factorized:
+            self.noise_in.copy_(self.transform_noise(self.noise_in))
+            self.noise_out_weight.copy_(self.transform_noise(self.noise_out_weight))
+        else:
+            self.weight_epsilon.copy_(
+                self.transform_noise(self.noise_out_weight).ger(
+                    self.transform_noise(self.noise_in)
+                )
             )
-        )
         self.bias_epsilon.copy_(self.transform_noise(self.noise_out_bias))
 
     @staticmethod
@@ -87,6 +116,40 @@ class NoisyLinear(nn.Module):
         return x.sign().mul(x.abs().sqrt())
 
 
+class EnsembleLinear(nn.Module):
+    """``num_heads`` independent linear layers evaluated as one batched matmul.
+
+    Takes ``b x in`` (the same input for every head) or ``k x b x in`` and
+    returns ``k x b x out``.
+    """
+
+    def __init__(self, in_features, out_features, num_heads):
+        super(EnsembleLinear, self).__init__()
+        self.num_heads = num_heads
+        self.weight = nn.Parameter(torch.empty(num_heads, out_features, in_features))
+        self.bias = nn.Parameter(torch.zeros(num_heads, 1, out_features))
+        for weight in self.weight.data:
+            nn.init.kaiming_uniform_(weight, a=np.sqrt(5))
+
+    def forward(self, x, heads=None):
+        # heads (an index or slice) runs only a subset of the heads.
+        weight, bias = self.weight, self.bias
+        if heads is not None:
+            weight, bias = weight[heads], bias[heads]
+        if x.dim() == 2:
+            # A shared input needs one matmul against all heads' weights at once.
+            y = F.linear(x, weight.flatten(0, 1))
+            y = rearrange(y, "b (k o) -> k b o", k=len(weight))
+            return y + bias
+        return torch.baddbmm(bias, x, weight.transpose(1, 2))
+
+
+def dense_layer(noisy, factorized, num_heads):
+    if num_heads > 1:
+        return partial(EnsembleLinear, num_heads=num_heads)
+    return partial(NoisyLinear, factorized=factorized) if noisy else nn.Linear
+
+
 class ConvEncoder(nn.Module):
     def __init__(self, chan_dim):
         super(ConvEncoder, self).__init__()
@@ -106,9 +169,19 @@ class ConvEncoder(nn.Module):
 
 
 class DQNHead(nn.Module):
-    def __init__(self, act_dim: int, feat_dim: int, dueling: bool, noisy: bool, *args):
+    def __init__(
+        self,
+        act_dim: int,
+        feat_dim: int,
+        dueling: bool,
+        noisy: bool,
+        *args,
+        factorized: bool = False,
+        num_heads: int = 1,
+    ):
         super(DQNHead, self).__init__()
-        Dense = NoisyLinear if noisy else nn.Linear
+        Dense = dense_layer(noisy, factorized, num_heads)
+        self.num_heads = num_heads
         self.first_dense = Dense(feat_dim, 512)
         self.first_dense.apply(lambda m: init(m, nn.init.calculate_gain("relu")))
         self.q_head = Dense(512, act_dim)
@@ -128,7 +201,8 @@ class DQNHead(nn.Module):
             value = self.value_head(x)
             advantage = q - q.mean(dim=-1, keepdim=True)
             q = value + advantage
-        return q
+        # Heads are stacked along the batch dimension: (k b) a.
+        return q.flatten(0, 1) if self.num_heads > 1 else q
 
     def qval(self, x):
         return self.forward(x)
@@ -136,10 +210,18 @@ class DQNHead(nn.Module):
 
 class C51Head(nn.Module):
     def __init__(
-        self, act_dim: int, feat_dim: int, dueling: bool, noisy: bool, cfg: C51Config
+        self,
+        act_dim: int,
+        feat_dim: int,
+        dueling: bool,
+        noisy: bool,
+        cfg: C51Config,
+        factorized: bool = False,
+        num_heads: int = 1,
     ):
         super(C51Head, self).__init__()
-        Dense = NoisyLinear if noisy else nn.Linear
+        Dense = dense_layer(noisy, factorized, num_heads)
+        self.num_heads = num_heads
         self.first_dense = Dense(feat_dim, 512)
         self.first_dense.apply(lambda m: init(m, nn.init.calculate_gain("relu")))
 
@@ -163,14 +245,14 @@ class C51Head(nn.Module):
     def forward(self, x):
         x = F.relu(self.first_dense(x))
         q = self.q_head(x)
-        q = rearrange(q, "b (a n) -> b a n", a=self.action_dim)
+        q = rearrange(q, "... (a n) -> ... a n", a=self.action_dim)
 
         if self.value_head is not None:
             value = self.value_head(x)
-            value = rearrange(value, "b n -> b 1 n")
-            advantage = q - q.mean(dim=1, keepdim=True)
+            value = rearrange(value, "... n -> ... 1 n")
+            advantage = q - q.mean(dim=-2, keepdim=True)
             q = value + advantage
-        return q
+        return q.flatten(0, 1) if self.num_heads > 1 else q
 
     def qval(self, x):
         q_dist = self.forward(x)
@@ -179,9 +261,24 @@ class C51Head(nn.Module):
 
 class QRHead(C51Head):
     def __init__(
-        self, act_dim: int, feat_dim: int, dueling: bool, noisy: bool, cfg: QRConfig
+        self,
+        act_dim: int,
+        feat_dim: int,
+        dueling: bool,
+        noisy: bool,
+        cfg: QRConfig,
+        factorized: bool = False,
+        num_heads: int = 1,
     ):
-        super(QRHead, self).__init__(act_dim, feat_dim, dueling, noisy, cfg)
+        super(QRHead, self).__init__(
+            act_dim,
+            feat_dim,
+            dueling,
+            noisy,
+            cfg,
+            factorized=factorized,
+            num_heads=num_heads,
+        )
         self.register_buffer(
             "cumulative_density",
             (2 * torch.arange(cfg.num_atoms) + 1) / (2.0 * cfg.num_atoms),
@@ -194,11 +291,19 @@ class QRHead(C51Head):
 
 class IQNHead(nn.Module):
     def __init__(
-        self, act_dim: int, feat_dim: int, dueling: bool, noisy: bool, cfg: IQNConfig
+        self,
+        act_dim: int,
+        feat_dim: int,
+        dueling: bool,
+        noisy: bool,
+        cfg: IQNConfig,
+        factorized: bool = False,
+        num_heads: int = 1,
     ):
         super(IQNHead, self).__init__()
-        Dense = NoisyLinear if noisy else nn.Linear
+        Dense = dense_layer(noisy, factorized, num_heads)
         self.cfg = cfg
+        self.num_heads = num_heads
         self.first_dense = Dense(feat_dim, 512)
         self.first_dense.apply(lambda m: init(m, nn.init.calculate_gain("relu")))
 
@@ -229,7 +334,10 @@ class IQNHead(nn.Module):
             value = self.value_head(features)
             advantage = q - q.mean(dim=-1, keepdim=True)
             q = value + advantage
-        q = rearrange(q, "(b n) a -> b n a", n=n)
+        q = rearrange(q, "... (b n) a -> ... b n a", n=n)
+        if self.num_heads > 1:
+            # All heads share the sampled taus.
+            return q.flatten(0, 1), taus.repeat(self.num_heads, 1, 1)
         return q, taus
 
     def feature_emb(self, x, n, taus):
@@ -259,9 +367,24 @@ class IQNHead(nn.Module):
 
 class FQFHead(IQNHead):
     def __init__(
-        self, act_dim: int, feat_dim: int, dueling: bool, noisy: bool, cfg: IQNConfig
+        self,
+        act_dim: int,
+        feat_dim: int,
+        dueling: bool,
+        noisy: bool,
+        cfg: IQNConfig,
+        factorized: bool = False,
+        num_heads: int = 1,
     ):
-        super(FQFHead, self).__init__(act_dim, feat_dim, dueling, noisy, cfg)
+        super(FQFHead, self).__init__(
+            act_dim,
+            feat_dim,
+            dueling,
+            noisy,
+            cfg,
+            factorized=factorized,
+            num_heads=num_heads,
+        )
         self.fraction_net = nn.Linear(feat_dim, cfg.F)
         self.fraction_net.apply(lambda m: init_xavier(m, 0.01))
 
@@ -312,12 +435,17 @@ class DeepQNet(nn.Module):
 
         algo = cfg.learner.algo
         assert algo in headers and algo in head_cfgs
+        self.num_heads = cfg.learner.num_heads
+        if self.num_heads > 1 and (algo == AlgoEnum.fqf or cfg.learner.noisy_net):
+            raise ValueError("Ensemble heads do not support fqf or noisy nets")
         self.head = headers[algo](
             cfg.action_dim,
             feat_dim,
             cfg.learner.dueling_head,
             cfg.learner.noisy_net,
             head_cfgs[algo],
+            factorized=cfg.learner.noisy_factorized,
+            num_heads=self.num_heads,
         )
 
     def forward(self, x):
@@ -329,6 +457,10 @@ class DeepQNet(nn.Module):
         x = self.encoder(x)
         return self.head.qval(x)
 
+    def head_qvals(self, x):
+        # k b a: Q-values of every head from a single encoder pass.
+        return self.qval(x).view(self.num_heads, x.size(0), -1)
+
     def params(self):
         return chain(v for k, v in self.named_parameters() if "fraction" not in k)
 
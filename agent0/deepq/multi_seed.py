@@ -0,0 +1,208 @@
+import copy
+import os
+import time
+
+import torch
+import torch.nn as nn
+from torch.func import functional_call, stack_module_state, vmap
+
+from agent0.common.timing import timer
+from agent0.common.utils import masked_adam_step
+from agent0.deepq.config import AlgoEnum, ExpConfig
+from agent0.deepq.trainer import Trainer
+
+# FQF keeps a second optimizer with per-network gradient clipping and noisy nets
+# resample buffers in place; neither maps onto one stacked Adam step.
+STACKABLE = (AlgoEnum.dqn, AlgoEnum.mdqn, AlgoEnum.c51, AlgoEnum.qr, AlgoEnum.iqn)
+
+
+class _TrainStep(nn.Module):
+    # Registers the online and target nets so functional_call can swap in the
+    # weights of one replica while the learner's own train_step runs.
+    def __init__(self, learner):
+        super().__init__()
+        self.model = learner.model
+        self.model_target = learner.model_target
+        self.train_step = learner.train_step
+
+    def forward(self, obs, actions, rewards, terminals, next_obs):
+        return self.train_step(obs, actions, rewards, terminals, next_obs)
+
+
+class StackedLearner:
+    """K independent learners trained with one vmapped forward and backward.
+
+    Parameters of all replicas are stacked along a leading dimension and the
+    loss of each replica only depends on its own slice, so summing the losses
+    gives every replica exactly its own gradient. Adam is elementwise, which
+    makes a single optimizer over the stacked tensors equivalent to K separate
+    ones.
+    """
+
+    def __init__(self, learners):
+        cfg = learners[0].cfg
+        if cfg.learner.algo not in STACKABLE or cfg.learner.noisy_net:
+            raise ValueError(
+                f"Multi-seed training does not support {cfg.learner.algo.name}"
+                + (" with noisy nets" if cfg.learner.noisy_net else "")
+            )
+        if cfg.learner.num_heads > 1:
+            # Head masks and repeated targets live in BaseLearner.train.
+            raise ValueError("Multi-seed training does not support ensemble heads")
+        self.cfg = cfg
+        self.learners = learners
+        self.num_replicas = len(learners)
+        self.step_module = _TrainStep(learners[0])
+
+        modules = [_TrainStep(learner) for learner in learners]
+        params, self.buffers = stack_module_state(modules)
+        self.online = [k for k in params if k.startswith("model.")]
+        self.params = {
+            k: v.detach().requires_grad_(k in self.online) for k, v in params.items()
+        }
+        self.optimizer = torch.optim.Adam(
+            [self.params[k] for k in self.online],
+            cfg.learner.learning_rate,
+            eps=1e-2 / cfg.learner.batch_size,
+        )
+        # BaseLearner.update_steps and skipped_steps, one per replica.
+        self.update_steps = [0] * self.num_replicas
+        self.skipped_steps = torch.zeros(
+            self.num_replicas, dtype=torch.long, device=cfg.device.value
+        )
+
+    def loss(self, params, buffers, frames, actions, rewards, terminals):
+        cfg = self.cfg
+        frames = frames.reshape(-1, cfg.obs_shape[0] * 2, *cfg.obs_shape[1:]).div(
+            255.0
+        )
+        obs, next_obs = torch.split(frames, cfg.obs_shape[0], 1)
+        return functional_call(
+            self.step_module,
+            (params, buffers),
+            (obs, actions.long(), rewards, terminals, next_obs),
+        )
+
+    def train(self, data):
+        # Every tensor in data is stacked: K x batch_size x ...
+        frames, actions, rewards, terminals, weights, indices, _ = data
+        with timer.phase("forward"):
+            q_loss = vmap(self.loss, randomness="different")(
+                self.params, self.buffers, frames, actions, rewards, terminals
+            )
+
+        self.optimizer.zero_grad()
+        with timer.phase("backward"):
+            q_loss.mul(weights).sum().backward()
+
+        with timer.phase("optim"):
+            # BaseLearner's non-finite skip, applied to each replica's slice.
+            finite = torch.isfinite(q_loss).all(dim=-1)
+            masked_adam_step(self.optimizer, finite)
+            self.skipped_steps += finite.logical_not()
+        self.update_steps = [n + 1 for n in self.update_steps]
+
+        # Target syncs follow each replica's finite updates, as in BaseLearner.
+        freq = self.cfg.learner.target_update_freq
+        if any(n % freq == 0 for n in self.update_steps):
+            due = [i for i, n in enumerate(self.resolve_steps()) if n % freq == 0]
+            with torch.no_grad():
+                for k in self.online:
+                    target = self.params[k.replace("model.", "model_target.", 1)]
+                    for i in due:
+                        target[i].copy_(self.params[k][i])
+
+        return [
+            {
+                "q_loss": q_loss[i].detach(),
+                "fraction_loss": None,
+                "nonfinite": finite[i].logical_not(),
+                "indices": indices[i].long(),
+            }
+            for i in range(self.num_replicas)
+        ]
+
+    def resolve_steps(self):
+        # Takes skipped updates out of update_steps; waits for the device.
+        skipped = self.skipped_steps.tolist()
+        self.skipped_steps.zero_()
+        self.update_steps = [n - s for n, s in zip(self.update_steps, skipped)]
+        return self.update_steps
+
+    @torch.no_grad()
+    def sync(self):
+        # Copy the stacked weights into each replica's own nets, which its
+        # actors act with and checkpoints are taken from.
+        for i, learner in enumerate(self.learners):
+            for k, v in self.params.items():
+                name = k.split(".", 1)[1]
+                net = learner.model if k in self.online else learner.model_target
+                net.get_parameter(name).copy_(v[i])
+
+
+class MultiSeedTrainer:
+    """Runs ``trainer.num_seeds`` independent seeds in one process.
+
+    Each seed is a full Trainer with its own actors, replay, metrics and log
+    directory (``<logdir>/seed<k>``); only the learner update is batched.
+    """
+
+    def __init__(self, cfg: ExpConfig):
+        self.cfg = cfg
+        self.replicas = []
+        for i in range(cfg.trainer.num_seeds):
+            replica_cfg = copy.deepcopy(cfg)
+            replica_cfg.seed = cfg.seed + i
+            replica_cfg.logdir = os.path.join(cfg.logdir, f"seed{replica_cfg.seed}")
+            # One wandb run per process; replicas log to TensorBoard and files.
+            replica_cfg.wandb = False
+            # Optimizer state lives in the stacked learner, not in the replicas.
+            replica_cfg.trainer.checkpoint_freq = 0
+            replica_cfg.trainer.resume = ""
+            self.replicas.append(Trainer(replica_cfg))
+        self.learner = StackedLearner([r.learner for r in self.replicas])
+        self.logger = self.replicas[0].logger
+
+    def frame_count(self):
+        return sum(r.frame_count for r in self.replicas)
+
+    def update(self):
+        batches = [r.sample_batch() for r in self.replicas]
+        data = tuple(torch.stack(x) for x in zip(*batches))
+        for replica, result in zip(self.replicas, self.learner.train(data)):
+            replica.record(result)
+
+    def run(self):
+        cfg = self.cfg
+        num_transitions = self.replicas[0].num_transitions
+        trainer_steps = cfg.trainer.total_steps // num_transitions + 1
+        tic, last_frames = time.time(), 0
+        for step in range(trainer_steps):
+            if step % cfg.trainer.test_freq == 0:
+                for replica in self.replicas:
+                    replica.test()
+                tic, last_frames = time.time(), self.frame_count()
+
+            for replica in self.replicas:
+                epsilon = replica.epsilon_fn(replica.frame_count)
+                replica.ingest(*replica.actors[1].sample(epsilon))
+
+            ready = all(
+                len(r.replay) > cfg.trainer.training_start_steps for r in self.replicas
+            )
+            if ready:
+                for _ in range(cfg.learner.learner_steps):
+                    self.update()
+                self.learner.sync()
+
+            if (step + 1) % cfg.trainer.log_freq == 0:
+                # Total frames/sec over all seeds.
+                fps = (self.frame_count() - last_frames) / (time.time() - tic)
+                for replica in self.replicas:
+                    result = replica.summary()
+                    result.update(fps=fps)
+                    replica.logging(result)
+                tic, last_frames = time.time(), self.frame_count()
+
+        for replica in self.replicas:
+            replica.final()
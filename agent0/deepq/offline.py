@@ -0,0 +1,114 @@
+import multiprocessing as mp
+import time
+from concurrent import futures
+
+import numpy as np
+import torch
+
+from agent0.common.checkpoint import load_model_state, snapshot
+from agent0.deepq.config import ExpConfig
+from agent0.deepq.trainer import Trainer
+
+
+def evaluate(cfg: ExpConfig, state_dict):
+    # Runs in the side process; one thread so it does not compete with the learner.
+    from agent0.deepq.agent import Actor
+
+    torch.set_num_threads(1)
+    actor = Actor(cfg)
+    actor.model.load_state_dict(state_dict)
+    returns = []
+    while len(returns) < cfg.trainer.test_episodes:
+        _, rs, _ = actor.sample(cfg.actor.test_eps, test=True)
+        returns.extend(rs)
+    actor.close()
+    return returns
+
+
+class OfflineTrainer(Trainer):
+    """Trains a learner on a stored replay, with no actors or envs in the loop.
+
+    Batches go through the same DataLoader and prefetch pipeline as online
+    training. ``frames`` in the logs counts transitions sampled by the learner.
+    """
+
+    def __init__(self, cfg: ExpConfig):
+        super().__init__(cfg, use_lp=True)
+        if cfg.checkpoint:
+            state = load_model_state(cfg.checkpoint)
+            self.learner.model.load_state_dict(state)
+            self.learner.model_target.load_state_dict(state)
+
+        tic = time.time()
+        self.replay.load(cfg.offline.replay)
+        self.logger.info(
+            f"Loaded {len(self.replay)} transitions from {cfg.offline.replay} "
+            f"in {time.time() - tic:.1f}s"
+        )
+
+        self.evaluator = None
+        if cfg.offline.eval_freq > 0:
+            self.evaluator = futures.ProcessPoolExecutor(
+                1, mp_context=mp.get_context("spawn")
+            )
+        self.evaluation = None
+
+    def evaluate(self):
+        # At most one evaluation in flight; a slow one skips the next round.
+        if self.evaluation is not None and not self.evaluation[0].done():
+            return
+        self.collect()
+        state_dict = snapshot(self.learner.model.state_dict())
+        self.evaluation = (
+            self.evaluator.submit(evaluate, self.cfg, state_dict),
+            self.learner.update_steps,
+            self.frame_count,
+        )
+
+    def collect(self, wait=False):
+        if self.evaluation is None:
+            return
+        future, updates, frames = self.evaluation
+        if not wait and not future.done():
+            return
+        returns = future.result()
+        self.evaluation = None
+        self.RTs.extend(returns)
+        self.save_best(returns, frames)
+        self.sink.scalar("return_test", np.mean(returns), frames)
+        self.sink.scalar("return_test_max", self.RTs.best(), frames)
+        self.sink.info(
+            f"TEST ---> Updates: {updates} | Return Avg: {np.mean(returns):.2f} "
+            f"Max: {np.max(returns)}"
+        )
+
+    def run(self):
+        cfg = self.cfg
+        batch_size = cfg.learner.batch_size
+        log_every = cfg.trainer.log_freq * cfg.learner.learner_steps
+        tic, last_updates = time.time(), 0
+        for update in range(cfg.offline.updates):
+            if self.evaluator is not None and update % cfg.offline.eval_freq == 0:
+                self.evaluate()
+
+            self.update()
+            self.frame_count += batch_size
+
+            if (update + 1) % log_every == 0:
+                self.collect()
+                result = self.summary()
+                ups = (update + 1 - last_updates) / (time.time() - tic)
+                result.update(ups=ups, sps=ups * batch_size)
+                self.logging(result)
+                tic, last_updates = time.time(), update + 1
+
+        self.final()
+
+    def final(self):
+        if self.evaluator is not None:
+            self.collect(wait=True)
+            self.evaluate()
+            self.collect(wait=True)
+            self.evaluator.shutdown()
+        self.close_checkpointer()
+        self.sink.close()
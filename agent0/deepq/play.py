@@ -0,0 +1,73 @@
+import time
+
+import numpy as np
+import torch
+
+from agent0.common.atari_wrappers import make_atari
+from agent0.common.checkpoint import load_model_state
+from agent0.deepq.config import ExpConfig, env_kwargs
+from agent0.deepq.model import DeepQNet
+
+
+def load_model(cfg: ExpConfig):
+    state = load_model_state(cfg.checkpoint)
+    # assign hands the mapped tensors to the model instead of copying them. The
+    # meta device would also skip the random init, but its one-time setup costs
+    # more than the init on the first call in a process.
+    model = DeepQNet(cfg)
+    model.load_state_dict(state, assign=True)
+    return model.to(cfg.device.value).eval()
+
+
+def play(cfg: ExpConfig):
+    """Greedy rollouts of a saved model; no learner, replay or metric backends."""
+    tic = time.perf_counter()
+    model = load_model(cfg)
+    t_load = time.perf_counter() - tic
+
+    num_envs = cfg.actor.num_envs
+    envs = make_atari(
+        cfg.env_id,
+        num_envs,
+        vectorization_mode=cfg.actor.vector_mode.value,
+        **env_kwargs(cfg),
+    )
+    obs, _ = envs.reset(seed=cfg.seed)
+    t_env = time.perf_counter() - tic - t_load
+
+    returns, frames, t_first = [], 0, None
+    play_tic = time.perf_counter()
+    with torch.inference_mode():
+        while len(returns) < cfg.trainer.test_episodes:
+            st = torch.from_numpy(obs).to(cfg.device.value).float().div(255.0)
+            qt = model.head_qvals(st).mean(dim=0)
+            action = qt.argmax(dim=-1).cpu().numpy()
+            explore = np.random.rand(num_envs) < cfg.actor.test_eps
+            action[explore] = np.random.randint(0, cfg.action_dim, explore.sum())
+            if t_first is None:
+                t_first = time.perf_counter() - tic
+                play_tic = time.perf_counter()
+
+            obs, _, _, _, info = envs.step(action)
+            frames += num_envs
+            if "final_info" in info:
+                for stat in info["final_info"][info["_final_info"]]:
+                    returns.append(stat["episode"]["r"][0])
+    fps = frames / (time.perf_counter() - play_tic)
+    envs.close()
+    if t_first is None:
+        # test_episodes=0: no action was taken, report the setup time.
+        t_first = time.perf_counter() - tic
+    avg, best = (np.mean(returns), np.max(returns)) if returns else (np.nan, np.nan)
+
+    print(
+        f"Time to first action {t_first:.3f}s "
+        f"(model {t_load:.3f}s | envs {t_env:.3f}s) | {fps:.1f} fps"
+    )
+    print(f"PLAY ---> Episodes: {len(returns)} | Return Avg: {avg:.2f} Max: {best}")
+    return dict(
+        time_to_first_action=t_first,
+        fps=fps,
+        return_play=avg,
+        return_play_max=best,
+    )
@@ -1,5 +1,7 @@
 import copy
+import os
 import random
+import shutil
 from collections import deque
 
 import numpy as np
@@ -18,6 +20,13 @@ class ReplayDataset(Dataset, Sampler):
         self.data = deque(maxlen=cfg.replay.size)
         self.priority = torch.ones(cfg.replay.size)
         self.top = 0
+        # Bootstrap masks of the ensemble heads, drawn once per transition. They
+        # sit in a ring indexed by insertion count, as data positions shift
+        # once the deque is full.
+        self.head_mask = torch.ones(
+            cfg.replay.size, cfg.learner.num_heads, dtype=torch.bool
+        )
+        self.inserted = 0
 
         if self.cfg.replay.policy == ReplayEnum.prioritize:
             self.beta_schedule = LinearSchedule(
@@ -34,7 +43,8 @@ class ReplayDataset(Dataset, Sampler):
         frames, at, rt, dt = self.data[idx]
         frames = np.frombuffer(decompress(frames), dtype=np.uint8)
         priority = self.priority[idx]
-        return np.array(frames), at, rt, dt, priority, idx
+        mask = self.head_mask[self.slot(idx)]
+        return np.array(frames), at, rt, dt, priority, idx, mask
 
     def __iter__(self):
         for _ in range(self.top // self.cfg.learner.batch_size):
@@ -42,16 +52,77 @@ class ReplayDataset(Dataset, Sampler):
                 self.priority[: self.top], self.cfg.learner.batch_size, False
             ).tolist()
 
+    def slot(self, idx):
+        return (self.inserted - self.top + idx) % self.cfg.replay.size
+
     def extend(self, transitions):
         self.data.extend(transitions)
         num_entries = len(transitions)
         self.top = min(self.top + num_entries, self.cfg.replay.size)
 
+        if self.cfg.learner.num_heads > 1:
+            # Only the entries that stay in the deque need a mask.
+            new = torch.arange(max(num_entries - self.cfg.replay.size, 0), num_entries)
+            masks = torch.rand(len(new), self.cfg.learner.num_heads)
+            masks = masks.lt(self.cfg.learner.head_mask_prob)
+            self.head_mask[(self.inserted + new) % self.cfg.replay.size] = masks
+        self.inserted += num_entries
+
         if self.cfg.replay.policy == ReplayEnum.prioritize:
             self.priority.roll(-num_entries, 0)
             self.priority[-num_entries:] = self.max_p**self.cfg.replay.alpha
             self.beta = self.beta_schedule(num_entries)
 
+    def save(self, path):
+        # Frames stay lz4 compressed and are streamed into one file; per-entry
+        # fields go to an index next to it.
+        tmp = f"{path}.tmp"
+        os.makedirs(tmp, exist_ok=True)
+        offsets = np.zeros(len(self.data) + 1, dtype=np.int64)
+        with open(os.path.join(tmp, "frames.bin"), "wb") as f:
+            for i, (frames, _, _, _) in enumerate(self.data):
+                f.write(frames)
+                offsets[i + 1] = offsets[i] + len(frames)
+        np.savez(
+            os.path.join(tmp, "index.npz"),
+            offsets=offsets,
+            actions=np.array([x[1] for x in self.data]),
+            rewards=np.array([x[2] for x in self.data], dtype=np.float32),
+            terminals=np.array([x[3] for x in self.data], dtype=np.bool_),
+            priority=self.priority[: self.top].numpy(),
+            head_mask=self.head_mask[self.slot(torch.arange(self.top))].numpy(),
+            max_p=getattr(self, "max_p", 1.0),
+        )
+        shutil.rmtree(path, ignore_errors=True)
+        os.rename(tmp, path)
+
+    def load(self, path):
+        index = np.load(os.path.join(path, "index.npz"))
+        offsets = index["offsets"]
+        # Only the newest replay.size entries fit.
+        start = max(len(offsets) - 1 - self.cfg.replay.size, 0)
+        frames = np.memmap(os.path.join(path, "frames.bin"), dtype=np.uint8, mode="r")
+        self.extend(
+            [
+                (frames[offsets[i] : offsets[i + 1]].tobytes(), at, rt, dt)
+                for i, at, rt, dt in zip(
+                    range(start, len(offsets) - 1),
+                    index["actions"][start:],
+                    index["rewards"][start:],
+                    index["terminals"][start:],
+                )
+            ]
+        )
+        self.priority[: self.top] = torch.from_numpy(index["priority"][start:])
+        # Replays saved before masks were stored, or with another head count,
+        # keep the masks extend just drew.
+        masks = index["head_mask"] if "head_mask" in index else None
+        if masks is not None and masks.shape[1] == self.cfg.learner.num_heads:
+            masks = torch.from_numpy(masks[start:])
+            self.head_mask[self.slot(torch.arange(self.top))] = masks
+        if self.cfg.replay.policy == ReplayEnum.prioritize:
+            self.max_p = float(index["max_p"])
+
     def update_priority(self, ids, priorities):
         self.priority[ids] = (priorities + self.cfg.replay.eps).pow(
             self.cfg.replay.alpha
@@ -2,31 +2,43 @@ import logging
 import os
 import time
 from dataclasses import asdict
+from functools import partial
 
 import numpy as np
+import torch
 from einops import repeat
-from tensorboardX import SummaryWriter
+from torch.utils.data import DataLoader
 
 import agent0.deepq.agent as agents
-import wandb
-from agent0.common.atari_wrappers import make_atari
-from agent0.common.utils import (DataLoaderX, DataPrefetcher, EnumEncoder,
-                                 set_random_seed)
-from agent0.deepq.config import ExpConfig
+from agent0.common.checkpoint import (Checkpointer, load_checkpoint,
+                                      load_model_state)
+from agent0.common.metrics_sink import MetricsSink
+from agent0.common.resources import apply_slot, format_plan, pin_worker
+from agent0.common.timing import timer
+from agent0.common.utils import (DataPrefetcher, EnumEncoder, MetricAccumulator,
+                                 WindowStat, set_random_seed)
+from agent0.deepq.config import DeviceEnum, ExpConfig, ModeEnum, resource_plan
 from agent0.deepq.replay import ReplayDataset, ReplayEnum
 
 
+def epsilon_schedule(cfg: ExpConfig, step):
+    # Finetuning starts from a trained policy, which also fills the warm-up replay.
+    if cfg.mode == ModeEnum.finetune or step > cfg.trainer.exploration_steps:
+        return cfg.actor.min_eps
+    return (1.0 - step / cfg.trainer.exploration_steps) + cfg.actor.min_eps
+
+
 class Trainer:
     def __init__(self, cfg: ExpConfig, use_lp=False):
         self.cfg = cfg
         self.use_lp = use_lp
 
         set_random_seed(cfg.seed)
-
-        dummy_env = make_atari(cfg.env_id, 1)
-        self.obs_shape = dummy_env.observation_space.shape[1:]
-        self.act_dim = dummy_env.action_space[0].n
-        dummy_env.close()
+        self.resources = None
+        if cfg.resources.enabled:
+            self.resources = self.resource_plan()
+            apply_slot(self.resources["trainer"])
+        timer.configure(cfg.trainer.phase_timing, cfg.trainer.phase_timing_sync)
 
         try:
             self.learner = getattr(
@@ -36,6 +48,10 @@ class Trainer:
             raise NotImplementedError(
                 f"No such learner for {self.cfg.learner.algo.name}"
             )
+        if cfg.mode == ModeEnum.finetune:
+            state = load_model_state(cfg.checkpoint)
+            self.learner.model.load_state_dict(state)
+            self.learner.model_target.load_state_dict(state)
         self.replay = ReplayDataset(cfg)
         if not use_lp:
             self.actors = [
@@ -43,79 +59,202 @@ class Trainer:
                 agents.Actor(cfg, self.learner.model),
             ]
 
-        self.epsilon_fn = (
-            lambda step: cfg.actor.min_eps
-            if step > cfg.trainer.exploration_steps
-            else (1.0 - step / cfg.trainer.exploration_steps) + cfg.actor.min_eps
-        )
+        self.epsilon_fn = partial(epsilon_schedule, cfg)
 
         if cfg.wandb:
+            import wandb
+
             wandb.init(project=cfg.name, config=asdict(cfg))
-        if cfg.tb:
-            self.writer = SummaryWriter(cfg.logdir)
+        os.makedirs(cfg.logdir, exist_ok=True)
         self.logger = logging.getLogger("agent0")
         self.logger.addHandler(logging.FileHandler(os.path.join(cfg.logdir, "msg.log")))
+        self.sink = MetricsSink(
+            cfg.logdir, cfg.tb, cfg.wandb, self.logger, cfg.trainer.metrics_flush_secs
+        )
         self.num_transitions = cfg.actor.sample_steps * cfg.actor.num_envs
-        self.Ls, self.Rs, self.RTs, self.Qs, self.FLs = [], [], [], [], []
+        self.metrics = MetricAccumulator()
+        self.Rs, self.RTs, self.Qs = WindowStat(20), WindowStat(20), WindowStat(100)
         self.data_fetcher = None
+        self.data_stall = 0.0
         self.frame_count = 0
+        if self.resources is not None:
+            self.logger.info("Resource plan:\n" + format_plan(self.resources))
+
+        self.best_test = -np.inf
+        self.last_checkpoint = 0
+        self.checkpointer = None
+        if cfg.trainer.checkpoint_freq > 0:
+            self.checkpointer = Checkpointer(
+                os.path.join(cfg.logdir, "checkpoints"), cfg.trainer.checkpoint_keep
+            )
+        if cfg.trainer.resume:
+            self.restore(cfg.trainer.resume)
+
+    def resource_plan(self):
+        # The synchronous trainer steps its actors in-process.
+        return resource_plan(self.cfg, 0)
 
     def get_data_fetcher(self):
-        data_loader = DataLoaderX(
+        worker_init_fn = None
+        if self.resources is not None:
+            worker_init_fn = partial(pin_worker, self.resources["trainer"].data_cpus)
+        num_workers = self.cfg.trainer.data_workers
+        data_loader = DataLoader(
             self.replay,
             batch_size=self.cfg.learner.batch_size,
             shuffle=True,
-            num_workers=2,
-            pin_memory=True,
+            # Learners precompute batch-sized index tensors.
+            drop_last=True,
+            num_workers=num_workers,
+            pin_memory=self.cfg.device == DeviceEnum.cuda,
+            worker_init_fn=worker_init_fn,
+            prefetch_factor=self.cfg.trainer.prefetch_depth if num_workers else None,
+        )
+        return DataPrefetcher(
+            data_loader, self.cfg.device.value, self.cfg.trainer.prefetch_depth
         )
-        data_fetcher = DataPrefetcher(data_loader, self.cfg.device.value)
-        return data_fetcher
 
     def step(self, transitions, returns, qmax):
-        self.Qs.extend(qmax)
-        self.Rs.extend(returns)
-        self.replay.extend(transitions)
-        self.frame_count += self.num_transitions
+        self.ingest(transitions, returns, qmax)
 
         # Start training at
         if len(self.replay) > self.cfg.trainer.training_start_steps:
             for _ in range(self.cfg.learner.learner_steps):
-                try:
-                    data = self.data_fetcher.next()
-                except (StopIteration, AttributeError):
-                    self.data_fetcher = self.get_data_fetcher()
-                    data = self.data_fetcher.next()
-                frames, actions, rewards, terminals, priorities, indices = map(
-                    lambda x: x.float(), data
-                )
-                if self.cfg.replay.policy == ReplayEnum.prioritize:
-                    probs = priorities / self.replay.priority.sum().item()
-                    weights = (self.replay.top * probs).pow(-self.replay.beta)
-                    weights = weights / weights.max().add(1e-8)
-                else:
-                    weights = priorities
-                data = frames, actions, rewards, terminals, weights, indices
-                result = self.learner.train(data)
-                q_loss = result["q_loss"]
-                fraction_loss = result["fraction_loss"]
-                indices = result["indices"]
-
-                if self.cfg.replay.policy == ReplayEnum.prioritize:
-                    self.replay.update_priority(indices, priorities=q_loss)
-
-                if q_loss is not None:
-                    self.Ls.append(q_loss.mean().item())
-                if fraction_loss is not None:
-                    self.FLs.append(fraction_loss.mean().item())
+                self.update()
+
+    def ingest(self, transitions, returns, qmax):
+        self.Qs.extend(qmax)
+        self.Rs.extend(returns)
+        with timer.phase("replay_extend"):
+            self.replay.extend(transitions)
+        self.frame_count += self.num_transitions
+
+        since = self.frame_count - self.last_checkpoint
+        if self.checkpointer is not None and since >= self.cfg.trainer.checkpoint_freq:
+            self.checkpoint()
+
+    def checkpoint_state(self):
+        # Callables, so unchanged components are skipped without a copy.
+        state = {
+            name: value.state_dict
+            for name, value in vars(self.learner).items()
+            if isinstance(value, (torch.nn.Module, torch.optim.Optimizer))
+        }
+        state["trainer"] = lambda: dict(
+            frame_count=self.frame_count,
+            update_steps=self.learner.update_steps,
+            best_test=self.best_test,
+        )
+        return state
+
+    def checkpoint(self):
+        self.learner.resolve_steps()
+        # The target net only changes every target_update_freq updates.
+        target_version = (
+            self.learner.update_steps // self.cfg.learner.target_update_freq
+        )
+        self.checkpointer.save(
+            self.frame_count,
+            self.checkpoint_state(),
+            versions=dict(model_target=target_version),
+        )
+        self.last_checkpoint = self.frame_count
+
+    def restore(self, path):
+        path, _, state = load_checkpoint(path, self.cfg.device.value)
+        for name, value in vars(self.learner).items():
+            if name in state:
+                value.load_state_dict(state[name])
+        counters = state["trainer"]
+        # epsilon_fn only depends on frame_count, so exploration resumes as well.
+        self.frame_count = counters["frame_count"]
+        self.learner.update_steps = counters["update_steps"]
+        self.best_test = counters["best_test"]
+        self.last_checkpoint = self.frame_count
+        self.logger.info(f"Resumed from {path} at frame {self.frame_count}")
+
+    def save_best(self, returns, frames):
+        # The layout summary.py reads, as written by the ddpg trainer.
+        if self.checkpointer is None or np.mean(returns) <= self.best_test:
+            return
+        self.best_test = float(np.mean(returns))
+        self.checkpointer.save_file(
+            os.path.join(self.cfg.logdir, "best.pth"),
+            dict(
+                model=self.learner.model.state_dict(),
+                ITRs=[float(r) for r in returns],
+                frame_count=frames,
+                best=self.best_test,
+            ),
+        )
+
+    def snapshot_replay(self):
+        if self.cfg.trainer.save_replay:
+            path = os.path.join(self.cfg.logdir, "replay")
+            self.replay.save(path)
+            self.logger.info(f"Saved {len(self.replay)} transitions to {path}")
+
+    def close_checkpointer(self):
+        if self.checkpointer is None:
+            return
+        # Learner updates after the last periodic checkpoint are kept as well.
+        self.checkpoint()
+        self.checkpointer.close()
+
+    def update(self):
+        self.record(self.learner.train(self.sample_batch()))
 
+    def sample_batch(self):
+        # Sampling and decoding run in DataLoader workers; this is the wait for them.
+        with timer.phase("batch_fetch"):
+            try:
+                data = self.data_fetcher.next()
+            except (StopIteration, AttributeError):
+                # One pass over the replay ended; the next one sees new entries.
+                if self.data_fetcher is not None:
+                    self.data_stall += self.data_fetcher.pop_stall()
+                self.data_fetcher = self.get_data_fetcher()
+                data = self.data_fetcher.next()
+        # DataPrefetcher already copied the batch to the device on its side stream.
+        with timer.phase("cast"):
+            frames, actions, rewards, terminals, priorities, indices, masks = map(
+                lambda x: x.float(), data
+            )
+        if self.cfg.replay.policy == ReplayEnum.prioritize:
+            probs = priorities / self.replay.priority.sum().item()
+            weights = (self.replay.top * probs).pow(-self.replay.beta)
+            weights = weights / weights.max().add(1e-8)
+        else:
+            weights = priorities
+        return frames, actions, rewards, terminals, weights, indices, masks
+
+    def record(self, result):
+        q_loss = result["q_loss"]
+
+        if self.cfg.replay.policy == ReplayEnum.prioritize:
+            self.replay.update_priority(
+                result["indices"].cpu(),
+                priorities=q_loss.nan_to_num(0.0, 0.0, 0.0).cpu(),
+            )
+
+        self.metrics.add("loss", q_loss, valid=result["nonfinite"].logical_not())
+        self.metrics.add("fraction_loss", result["fraction_loss"])
+        self.metrics.add("nonfinite_loss", result["nonfinite"])
+
+    def summary(self):
+        # Flushes device-side metrics; call only every log_freq steps.
         result = dict(
             frames=self.frame_count,
-            fraction_loss=np.mean(self.FLs[-20:]) if len(self.FLs) > 0 else None,
-            loss=np.mean(self.Ls[-20:]) if len(self.Ls) > 0 else None,
-            return_train=np.mean(self.Rs[-20:]) if len(self.Rs) > 0 else None,
-            return_train_max=np.max(self.Rs) if len(self.Rs) > 0 else None,
-            qmax=np.mean(self.Qs[-100:]) if len(self.Qs) > 0 else None,
+            return_train=self.Rs.mean(),
+            return_train_max=self.Rs.best(),
+            qmax=self.Qs.mean(),
         )
+        result.update(self.metrics.flush())
+        result.update(timer.flush())
+        if self.data_fetcher is not None:
+            # Seconds the learner waited on the prefetch pipeline this interval.
+            result.update(data_stall=self.data_stall + self.data_fetcher.pop_stall())
+            self.data_stall = 0.0
         return result
 
     def test(self):
@@ -134,24 +273,12 @@ class Trainer:
         video = np.stack(video, axis=1)
         video = repeat(video, "n t c h w -> n t (3 c) h w")
         self.RTs.extend(rs)
+        self.save_best(rs, self.frame_count)
 
-        if self.cfg.tb:
-            self.writer.add_scalar("return_test", np.mean(rs), self.frame_count)
-            self.writer.add_scalar(
-                "return_test_max", np.max(self.RTs), self.frame_count
-            )
-            self.writer.add_video("test_video", video, self.frame_count, fps=60)
-
-        if self.cfg.wandb:
-            wandb.log({"return_test": np.mean(rs), "frame": self.frame_count})
-            wandb.log({"return_test_max": np.max(self.RTs), "frame": self.frame_count})
-            wandb.log(
-                {
-                    "test_video": wandb.Video(video, fps=60, format="mp4"),
-                    "frame": self.frame_count,
-                }
-            )
-        self.logger.info(
+        self.sink.scalar("return_test", np.mean(rs), self.frame_count)
+        self.sink.scalar("return_test_max", self.RTs.best(), self.frame_count)
+        self.sink.video("test_video", video, self.frame_count, fps=60)
+        self.sink.info(
             f"TEST ---> Frames: {self.frame_count} | Return Avg: {np.mean(rs):.2f} Max: {np.max(rs)}"
         )
 
@@ -160,30 +287,40 @@ class Trainer:
         for k, v in result.items():
             if v is None:
                 continue
-            if self.cfg.tb:
-                self.writer.add_scalar(k, v, self.frame_count)
-            if self.cfg.wandb:
-                wandb.log({k: v, "frame": self.frame_count})
-            if k in ["frames", "loss", "qmax", "fps"] or "return" in k:
+            if k in ["frames", "loss", "qmax", "fps", "ups", "sps"] or "return" in k:
                 msg += f"{k}: {v:.2f} | "
-        self.logger.info(msg)
+            elif k.startswith("t_") or k == "data_stall":
+                msg += f"{k}: {v:.3f}s | "
+        self.sink.scalars(result, self.frame_count)
+        self.sink.info(msg)
+
+    def trainer_steps(self):
+        # A resumed run only does the steps its restored frame_count has not.
+        total = self.cfg.trainer.total_steps // self.num_transitions + 1
+        return range(self.frame_count // self.num_transitions, total)
 
     def run(self):
-        trainer_steps = self.cfg.trainer.total_steps // self.num_transitions + 1
-        for step in range(trainer_steps):
+        tic, last_frames = time.time(), self.frame_count
+        for step in self.trainer_steps():
             if step % self.cfg.trainer.test_freq == 0:
                 self.test()
-            tic = time.time()
+                tic, last_frames = time.time(), self.frame_count
             epsilon = self.epsilon_fn(self.frame_count)
             transitions, returns, qmax = self.actors[1].sample(epsilon)
-            result = self.step(transitions, returns, qmax)
-            fps = self.num_transitions / (time.time() - tic)
-            result.update(fps=fps)
-            self.logging(result)
+            self.step(transitions, returns, qmax)
+            if (step + 1) % self.cfg.trainer.log_freq == 0:
+                result = self.summary()
+                fps = (self.frame_count - last_frames) / (time.time() - tic)
+                result.update(fps=fps)
+                self.logging(result)
+                tic, last_frames = time.time(), self.frame_count
 
         self.final()
 
     def final(self):
         self.test()
+        self.close_checkpointer()
+        self.snapshot_replay()
         for actor in self.actors:
             actor.close()
+        self.sink.close()
@@ -4,9 +4,9 @@ import gym
 import torch
 import torchvision as tv
 from PIL import Image
-from torch.utils.data import Dataset
+from torch.utils.data import DataLoader, Dataset
 
-from agent0.common.utils import DataLoaderX, DataPrefetcher, parse_arguments
+from agent0.common.utils import DataPrefetcher, parse_arguments
 from agent0.nips_encoder.model import ModelEncoder
 from agent0.nips_encoder.trainer import Config
 
@@ -41,7 +41,7 @@ if __name__ == "__main__":
             break
 
     dataset = EncoderDataset(transit, env.observation_space.shape)
-    data_loader = DataLoaderX(
+    data_loader = DataLoader(
         dataset, batch_size=32, shuffle=True, num_workers=4, pin_memory=True
     )
 
@@ -10,11 +10,11 @@ import torch.nn.functional as fx
 import torchvision as tv
 from lz4.block import compress, decompress
 from ray import tune
-from torch.utils.data import Dataset
+from torch.utils.data import DataLoader, Dataset
 from tqdm import tqdm
 
 from agent0.common.atari_wrappers import make_atari
-from agent0.common.utils import DataLoaderX, DataPrefetcher
+from agent0.common.utils import DataPrefetcher
 from agent0.common.vec_env import ShmemVecEnv
 from agent0.nips_encoder.model import ModelEncoder
 
@@ -116,7 +116,7 @@ class Trainer(tune.Trainable, ABC):
 
     def get_data_fetcher(self):
         dataset = EncoderDataset(self.replay, self.obs_shape)
-        data_loader = DataLoaderX(
+        data_loader = DataLoader(
             dataset,
             batch_size=self.cfg.batch_size,
             shuffle=True,
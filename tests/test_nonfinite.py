@@ -0,0 +1,87 @@
+import copy
+
+import pytest
+import torch
+
+import agent0.deepq.agent as agents
+from agent0.benchmarks.common import make_cfg, random_batch
+from agent0.deepq.config import AlgoEnum, DeviceEnum
+from agent0.deepq.multi_seed import StackedLearner
+
+
+def nan_batch(cfg):
+    batch = list(random_batch(cfg))
+    batch[2] = batch[2].clone()
+    batch[2][0] = float("nan")
+    return tuple(batch)
+
+
+def optimizer_state(optimizer):
+    return {
+        (i, k): v.clone()
+        for i, state in optimizer.state_dict()["state"].items()
+        for k, v in state.items()
+    }
+
+
+def same_state(a, b):
+    return a.keys() == b.keys() and all(torch.equal(a[k], b[k]) for k in a)
+
+
+@pytest.mark.parametrize("algo", [AlgoEnum.dqn, AlgoEnum.fqf])
+def test_nonfinite_update_is_skipped(algo):
+    cfg = make_cfg(algo, DeviceEnum.cpu, 8)
+    learner = getattr(agents, f"{algo.name.upper()}Learner")(cfg)
+    learner.train(random_batch(cfg))
+    params = copy.deepcopy(list(learner.model.params()))
+    state = optimizer_state(learner.optimizer)
+
+    result = learner.train(nan_batch(cfg))
+
+    assert result["nonfinite"].item()
+    assert all(torch.equal(a, b) for a, b in zip(params, learner.model.params()))
+    assert same_state(state, optimizer_state(learner.optimizer))
+    assert learner.resolve_steps() == 1
+
+
+def test_target_sync_counts_finite_updates_only():
+    cfg = make_cfg(AlgoEnum.dqn, DeviceEnum.cpu, 8)
+    cfg.learner.target_update_freq = 4
+    learner = agents.DQNLearner(cfg)
+    synced = []
+    for i in range(12):
+        target = learner.model_target
+        learner.train(nan_batch(cfg) if i in (2, 5) else random_batch(cfg))
+        if learner.model_target is not target:
+            synced.append(i)
+    assert synced == [4, 9]
+    assert learner.resolve_steps() == 10
+
+
+def test_stacked_learner_skips_nonfinite_replica():
+    cfg = make_cfg(AlgoEnum.dqn, DeviceEnum.cpu, 8)
+    learners = [agents.DQNLearner(cfg) for _ in range(2)]
+    singles = copy.deepcopy(learners)
+    stacked = StackedLearner(learners)
+    batches = [[random_batch(cfg), random_batch(cfg)] for _ in range(3)]
+    # Replica 1 sees a non-finite loss on the second update.
+    batches[1][1] = nan_batch(cfg)
+
+    for step, pair in enumerate(batches):
+        if step == 1:
+            params = {k: stacked.params[k][1].clone() for k in stacked.online}
+            state = optimizer_state(stacked.optimizer)
+        results = stacked.train(tuple(torch.stack(x) for x in zip(*pair)))
+        if step == 1:
+            assert [r["nonfinite"].item() for r in results] == [False, True]
+            assert all(torch.equal(stacked.params[k][1], params[k]) for k in params)
+            after = optimizer_state(stacked.optimizer)
+            assert all(torch.equal(state[k][1], after[k][1]) for k in state)
+        for single, batch in zip(singles, pair):
+            single.train(batch)
+
+    assert stacked.resolve_steps() == [3, 2]
+    stacked.sync()
+    for learner, single in zip(learners, singles):
+        for a, b in zip(learner.model.params(), single.model.params()):
+            torch.testing.assert_close(a, b)
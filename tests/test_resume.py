@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from agent0.deepq.async_trainer import AsyncTrainer
+from agent0.deepq.config import DeviceEnum, ExpConfig, VectorEnum
+from agent0.deepq.trainer import Trainer
+
+
+def make_cfg(logdir, resume=""):
+    cfg = ExpConfig(
+        env_id="Synthetic",
+        obs_shape=(4, 84, 84),
+        action_dim=6,
+        device=DeviceEnum.cpu,
+        wandb=False,
+        tb=False,
+        logdir=str(logdir),
+        num_actors=2,
+    )
+    # 80 frames per trainer step; total_steps=480 runs steps 0..6.
+    cfg.actor.num_envs = 4
+    cfg.actor.sample_steps = 20
+    cfg.actor.vector_mode = VectorEnum.sync
+    cfg.learner.batch_size = 16
+    cfg.replay.size = 1000
+    cfg.trainer.total_steps = 480
+    cfg.trainer.training_start_steps = 160
+    cfg.trainer.test_freq = 3
+    cfg.trainer.test_episodes = 1
+    cfg.trainer.log_freq = 1
+    cfg.trainer.data_workers = 0
+    cfg.trainer.checkpoint_freq = 160
+    cfg.trainer.checkpoint_keep = 10
+    cfg.trainer.resume = str(resume)
+    cfg.synthetic.episode_length = 30
+    return cfg
+
+
+@pytest.fixture(scope="module")
+def checkpoint(tmp_path_factory):
+    logdir = tmp_path_factory.mktemp("run")
+    trainer = Trainer(make_cfg(logdir))
+    trainer.run()
+    assert trainer.frame_count == 560
+    # Step 2, which is not a multiple of test_freq.
+    return os.path.join(logdir, "checkpoints", f"ckpt-{160:012d}")
+
+
+@pytest.mark.parametrize("trainer_cls", [Trainer, AsyncTrainer])
+def test_resume_runs_remaining_steps(trainer_cls, checkpoint, tmp_path):
+    trainer = trainer_cls(make_cfg(tmp_path, resume=checkpoint))
+    assert trainer.frame_count == 160
+    assert trainer.trainer_steps().start % trainer.cfg.trainer.test_freq != 0
+    trainer.run()
+    assert trainer.frame_count == 560